@@ -1,18 +1,37 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import APIRouter, FastAPI, HTTPException, UploadFile, File, Request, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import sys
 import os
-import requests
-from bs4 import BeautifulSoup
+import httpx
 import json
 import asyncio
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 import time
 import base64
-from openai import OpenAI
+import hashlib
+import functools
+import math
+import tempfile
+import logging
+from contextlib import asynccontextmanager
+from fetch_engine import FetchEngine, SingleFlight, UpstreamError
+from shared_state import SharedTokenBucket
+from cert_cache import CertCache
+from cert_store import CertStore
+from consignments import ConsignmentStore
+from jobs import JobManager, JobStore
+from image_cache import ImageExtractionCache, decode_image, fingerprint
+from listing_templates import TemplateRegistry
+from prefetch import RangePrefetcher, cert_ranges
+from response_cache import ResponseCache, etag_matches
+import bulk_io
+import log_format
+import compact_response
+import local_ocr
+import metrics
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,22 +39,188 @@ load_dotenv()
 # Get environment-specific variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 PSA_API_TOKEN = os.getenv("PSA_API_TOKEN")
+# Point these at the stand-in servers in benchmarks/stub_servers.py to run without real credentials
+PSA_API_BASE_URL = os.getenv("PSA_API_BASE_URL", "https://api.psacard.com/publicapi").rstrip("/")
+OPENAI_API_BASE_URL = os.getenv("OPENAI_API_BASE_URL", "https://api.openai.com/v1").rstrip("/")
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "").split(",")
 
-app = FastAPI()
+# Payload dumps are expensive (JSON serialization of whole responses), so they
+# are only produced when LOG_PAYLOADS is enabled and DEBUG logging is on
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "false").lower() == "true"
+# "text" appends structured fields (cert_number, stage, ...) as key=value pairs; "json" writes one object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+log_format.configure(LOG_LEVEL, LOG_FORMAT)
+logger = logging.getLogger(__name__)
+# httpx logs every upstream request at INFO, which is too chatty for batch runs
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
-# Configure CORS with specific settings
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["https://collectiq.tech", "http://localhost:5173"],
-    allow_methods=["GET", "POST", "OPTIONS"],
-    allow_headers=["Content-Type", "Authorization", "Accept"],
-    expose_headers=["*"],
-    max_age=3600,
-    allow_credentials=False
+def log_payload(message: str, payload):
+    """Log a full payload at DEBUG level, only serializing it when payload logging is enabled"""
+    if LOG_PAYLOADS and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %s", message, json.dumps(payload, indent=2, default=str))
+
+# Local storage for caches and other persistent state
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+# Upstream PSA API limits: how many requests may be in flight and how many per second
+PSA_MAX_CONCURRENCY = int(os.getenv("PSA_MAX_CONCURRENCY", "5"))
+PSA_RATE_LIMIT = float(os.getenv("PSA_RATE_LIMIT", "5"))
+PSA_RATE_BURST = int(os.getenv("PSA_RATE_BURST", "5"))
+# PSA_RATE_LIMIT is the starting rate; with adaptive control the rate moves between these bounds
+PSA_ADAPTIVE_RATE = os.getenv("PSA_ADAPTIVE_RATE", "true").lower() in ("1", "true", "yes")
+PSA_RATE_MIN = float(os.getenv("PSA_RATE_MIN", "0.5"))
+PSA_RATE_MAX = float(os.getenv("PSA_RATE_MAX", "20"))
+# Throttled (429/503), 5xx and network failures are retried this many times with backoff
+PSA_MAX_RETRIES = int(os.getenv("PSA_MAX_RETRIES", "4"))
+
+# With several worker processes (see serve.py) they must share one PSA request budget,
+# so the rate limiter lives in a SQLite file instead of process memory
+SHARED_STATE = os.getenv("SHARED_STATE", "false").lower() in ("1", "true", "yes")
+SHARED_STATE_PATH = os.path.join(DATA_DIR, "shared_state.sqlite3")
+psa_limiter = (
+    SharedTokenBucket(SHARED_STATE_PATH, "psa", PSA_RATE_LIMIT, PSA_RATE_BURST)
+    if SHARED_STATE and PSA_RATE_LIMIT > 0 else None
+)
+
+# Shared across all requests so connections are kept alive between lookups
+psa_engine = FetchEngine(
+    max_concurrency=PSA_MAX_CONCURRENCY,
+    rate=PSA_RATE_LIMIT,
+    burst=PSA_RATE_BURST,
+    name="psa",
+    max_retries=PSA_MAX_RETRIES,
+    adaptive=PSA_ADAPTIVE_RATE,
+    min_rate=PSA_RATE_MIN,
+    max_rate=PSA_RATE_MAX,
+    limiter=psa_limiter,
+)
+
+# Concurrent lookups of the same cert share a single upstream request
+psa_singleflight = SingleFlight()
+
+# Most certs a single batch lookup (including one built from uploaded images) may cover
+MAX_BATCH_CERTS = 100
+
+# Vision calls for slab photos share one client; the cap bounds parallel calls to OpenAI
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "5"))
+MAX_IMAGES_PER_REQUEST = int(os.getenv("MAX_IMAGES_PER_REQUEST", "50"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+openai_engine = FetchEngine(
+    max_concurrency=OPENAI_MAX_CONCURRENCY,
+    timeout=30.0,
+    name="openai",
+    max_retries=OPENAI_MAX_RETRIES,
+)
+
+# Re-uploaded slab photos reuse earlier extraction results instead of another vision call.
+# Near (perceptual) matches are off unless IMAGE_CACHE_MAX_DISTANCE >= 0, and are then only
+# used once a local barcode/OCR read of the new photo agrees with them.
+image_cache = ImageExtractionCache(
+    max_entries=int(os.getenv("IMAGE_CACHE_SIZE", "1024")),
+    max_distance=int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "-1")),
+)
+# Identical photos uploaded at the same time share one extraction
+image_singleflight = SingleFlight()
+
+# Barcode/OCR extraction runs locally first; OpenAI is only called below this confidence
+LOCAL_OCR_ENABLED = os.getenv("LOCAL_OCR_ENABLED", "true").lower() == "true"
+LOCAL_OCR_MIN_CONFIDENCE = float(os.getenv("LOCAL_OCR_MIN_CONFIDENCE", "0.9"))
+
+# Graded cert data effectively never changes, so cache it for a long time.
+# Certs PSA has no data for are cached for a shorter period in case they are graded later.
+# The SQLite tier is shared by every worker process; each keeps its own in-memory LRU in front.
+cert_cache = CertCache(
+    os.path.join(DATA_DIR, "cert_cache.sqlite3"),
+    max_entries=int(os.getenv("CERT_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("CERT_CACHE_TTL", str(30 * 86400))),
+    negative_ttl=float(os.getenv("CERT_CACHE_NEGATIVE_TTL", "86400")),
+)
+
+# Serialized single-lookup responses with their ETags, so repeat views skip listing generation and JSON encoding
+lookup_responses = ResponseCache(
+    max_entries=int(os.getenv("LOOKUP_RESPONSE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("LOOKUP_RESPONSE_CACHE_TTL", "3600")),
+)
+# Browsers revalidate after max-age; a CDN may keep serving for s-maxage
+LOOKUP_CACHE_CONTROL = (
+    f"public, max-age={int(os.getenv('LOOKUP_MAX_AGE', '300'))}, "
+    f"s-maxage={int(os.getenv('LOOKUP_S_MAXAGE', '86400'))}, "
+    f"stale-while-revalidate={int(os.getenv('LOOKUP_STALE_WHILE_REVALIDATE', '3600'))}"
+)
+
+# Listing templates per seller, compiled once at startup
+listing_templates = TemplateRegistry.from_file(os.getenv("LISTING_TEMPLATES_PATH"))
+MAX_LISTING_BATCH = int(os.getenv("MAX_LISTING_BATCH", "10000"))
+
+# Largest collection accepted by the grading EV endpoint
+MAX_EV_CARDS = int(os.getenv("MAX_EV_CARDS", "100000"))
+# Sweeps evaluate every combination of shifts, so the scenario count multiplies quickly
+MAX_SWEEP_SCENARIOS = int(os.getenv("MAX_SWEEP_SCENARIOS", "10000"))
+
+# Monte Carlo grading simulations: process pool size and per-request cap
+SIM_WORKERS = int(os.getenv("SIM_WORKERS", str(os.cpu_count() or 1)))
+MAX_SIMULATIONS = int(os.getenv("MAX_SIMULATIONS", "10000000"))
+# Work grows with cards x simulations, so that product is capped as well
+MAX_SIMULATION_SAMPLES = int(os.getenv("MAX_SIMULATION_SAMPLES", "100000000"))
+
+# Every cert successfully looked up is kept locally for inventory and population queries
+cert_store = CertStore(os.path.join(DATA_DIR, "cert_store.sqlite3"))
+
+# Consignment submissions are acknowledged immediately and written to disk in batches
+consignment_store = ConsignmentStore(
+    os.path.join(DATA_DIR, "consignments.sqlite3"),
+    batch_size=int(os.getenv("CONSIGNMENT_BATCH_SIZE", "100")),
+    flush_interval=float(os.getenv("CONSIGNMENT_FLUSH_INTERVAL", "0.5")),
+)
+
+# Bulk imports are spooled to disk past this size while they are being processed
+IMPORT_SPOOL_BYTES = int(os.getenv("IMPORT_SPOOL_BYTES", str(1024 * 1024)))
+
+# Background jobs for cert ranges too large for a single batch request.
+# Jobs are claimed from the SQLite store under a lease, so any number of worker processes can share them.
+JOB_MAX_CERTS = int(os.getenv("JOB_MAX_CERTS", "50000"))
+job_store = JobStore(os.path.join(DATA_DIR, "jobs.sqlite3"))
+job_manager = JobManager(
+    job_store,
+    run_lookups=lambda cert_numbers: psa_engine.imap_unordered(lookup_single_cert, cert_numbers),
+    workers=int(os.getenv("JOB_WORKERS", "1")),
+    lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "30")),
+    poll_interval=float(os.getenv("JOB_POLL_INTERVAL", "1")),
 )
 
-@app.options("/{full_path:path}")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_manager.start()
+    await consignment_store.start()
+    yield
+    await job_manager.stop()
+    await consignment_store.stop()
+    await prefetcher.stop()
+    await psa_engine.aclose()
+    await openai_engine.aclose()
+    cert_cache.close()
+    consignment_store.close()
+    cert_store.close()
+    job_store.close()
+    if psa_limiter is not None:
+        psa_limiter.close()
+    # Only loaded (and only has a process pool) once a simulation has run
+    if "grading_sim" in sys.modules:
+        sys.modules["grading_sim"].shutdown_executor()
+
+router = APIRouter()
+
+async def record_request_timing(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so per-cert paths don't create one series each
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.http_request_seconds.observe(time.perf_counter() - start, method=request.method, path=path)
+    return response
+
+@router.options("/{full_path:path}")
 async def options_handler(full_path: str):
     return JSONResponse(
         content={"status": "ok"},
@@ -52,7 +237,31 @@ class CertRequest(BaseModel):
 
 class CertRangeRequest(BaseModel):
     cert_input: str  # Can be either a range (e.g., "1234-5678") or comma-separated list (e.g., "1234,5678,9012")
-    delay: Optional[float] = 1.0
+    delay: Optional[float] = 1.0  # Deprecated: upstream pacing is handled by the shared PSA rate limiter
+    # Opt-in compact response for /api/psa/lookup/batch (see compact_response.py)
+    compact: bool = False
+    fields: Optional[List[str]] = None  # card_data fields to return; defaults to compact_response.DEFAULT_FIELDS
+    listing: str = "full"  # full, title or none
+
+class JobRequest(BaseModel):
+    cert_input: str  # Same format as CertRangeRequest, but ranges may span up to JOB_MAX_CERTS certs
+
+class ListingRenderRequest(BaseModel):
+    cards: List[dict]  # card_data records as returned by the lookup endpoints
+    seller: Optional[str] = None  # Listing template to use; the default template if omitted
+
+class GradingEVRequest(BaseModel):
+    cards: List[dict]  # Calculator inputs per card (rawPrice, gradingFee, psa10Price, psa10Rate, ...)
+    defaults: Optional[dict] = None  # Inputs shared by every card, e.g. fees and shipping
+    sweep: Optional[Dict[str, List[float]]] = None  # Percentage-point shifts per grade rate, e.g. {"psa10Rate": [-10, 0, 10]}
+    include_cards: bool = True
+
+class GradingSimulationRequest(BaseModel):
+    cards: List[dict]  # Same per-card inputs as GradingEVRequest
+    defaults: Optional[dict] = None
+    simulations: int = 100000
+    method: Optional[str] = None  # Sell every card this way; each card's best EV method if omitted
+    seed: Optional[int] = None
 
 class ConsignmentRequest(BaseModel):
     name: str
@@ -65,31 +274,57 @@ class ImageRequest(BaseModel):
     image: str
     prompt: str
 
-def get_psa_data(cert_number):
+class MultiImageRequest(BaseModel):
+    images: List[str]  # Base64 images or image URLs, one slab photo each
+    prompt: Optional[str] = None
+
+async def get_psa_data(cert_number):
     """Fetch data from PSA API based on cert number"""
-    print(f"Looking up PSA cert #{cert_number}")
+    logger.debug("Looking up PSA cert #%s", cert_number)
+    
+    found, cached = cert_cache.get(cert_number)
+    if found:
+        metrics.cert_cache_requests.inc(result="hit")
+        logger.debug("Cache hit for cert #%s", cert_number)
+        return cached
+    metrics.cert_cache_requests.inc(result="miss")
     
-    url = f"https://api.psacard.com/publicapi/cert/GetByCertNumber/{cert_number}"
+    card_data = await psa_singleflight.do(cert_number, lambda: fetch_psa_data(cert_number))
+    # Every coalesced waiter gets its own copy of the shared result
+    return dict(card_data) if card_data else card_data
+
+async def fetch_psa_data(cert_number, background: bool = False, promote: Optional[asyncio.Event] = None):
+    """Fetch cert data from the PSA API, bypassing the cache, and cache the result.
+
+    Raises UpstreamError when PSA keeps throttling or failing, so callers can tell a
+    temporary outage apart from a cert that doesn't exist. Background fetches only
+    use rate budget left over by regular lookups, until `promote` is set.
+    """
+    url = f"{PSA_API_BASE_URL}/cert/GetByCertNumber/{cert_number}"
     headers = {
         "Authorization": f"Bearer {PSA_API_TOKEN}",
         "Content-Type": "application/json"
     }
     
     try:
-        print(f"Making request to PSA API: {url}")
-        response = requests.get(url, headers=headers)
-        print(f"PSA API response status: {response.status_code}")
+        logger.debug("Making request to PSA API: %s", url)
+        if background:
+            # Mostly time spent waiting for spare budget, which isn't PSA latency
+            response = await psa_engine.get(url, headers=headers, background=True, promote=promote)
+        else:
+            with metrics.psa_upstream_seconds.time():
+                response = await psa_engine.get(url, headers=headers)
+        logger.debug("PSA API response status for cert #%s: %s", cert_number, response.status_code)
         
         if response.status_code == 200:
             data = response.json()
-            print(f"PSA API response data: {json.dumps(data, indent=2)}")
+            log_payload("PSA API response data", data)
             
             card_data = {'cert_number': cert_number}
             
             # Extract data from API response
             if 'PSACert' in data:
                 cert_data = data['PSACert']
-                print(f"Found PSACert data: {json.dumps(cert_data, indent=2)}")
                 
                 if isinstance(cert_data, dict):
                     # Extract all available fields
@@ -127,7 +362,7 @@ def get_psa_data(cert_number):
                             card_name = card_name.replace(variant, '').strip()
                     card_data['card_name'] = card_name
             else:
-                print("No PSACert data found in response")
+                logger.debug("No PSACert data found in response for cert #%s", cert_number)
                 # Try to extract data from root level
                 card_data.update({
                     'year': str(data.get('Year', '')),
@@ -140,172 +375,137 @@ def get_psa_data(cert_number):
                     'variants': []
                 })
             
-            print(f"Extracted card data: {json.dumps(card_data, indent=2)}")
-            return card_data
+            log_payload("Extracted card data", card_data)
         else:
-            print(f"Error response from PSA API: {response.text}")
+            logger.warning(
+                "Error response from PSA API for cert #%s: %s %s", cert_number, response.status_code, response.text[:200],
+                extra={"cert_number": cert_number, "stage": "psa_fetch", "status_code": response.status_code},
+            )
+            if response.status_code == 404:
+                await persist_psa_data(cert_number, None)
             return None
+    except UpstreamError:
+        logger.warning(
+            "PSA API unavailable for cert #%s after retries", cert_number,
+            extra={"cert_number": cert_number, "stage": "psa_fetch"},
+        )
+        raise
     except Exception as e:
-        print(f"Error fetching PSA data: {str(e)}")
+        logger.exception(
+            "Error fetching PSA data for cert #%s", cert_number,
+            extra={"cert_number": cert_number, "stage": "psa_fetch"},
+        )
         return None
 
-def generate_ebay_listing(card_data):
-    """Generate eBay listing from card data with structured format"""
-    print(f"Generating eBay listing for card data: {json.dumps(card_data, indent=2)}")
-    
-    if not card_data:
-        print("No card data provided")
-        return None
+    await persist_psa_data(cert_number, card_data)
+    lookup_responses.invalidate(cert_number)
+    return card_data
 
-    # Initialize title components following the suggested format:
-    # [Grading] [Card Name] [Card Variant/Rarity] [Set Name] [Set Number] [Language] [Franchise] [Year]
-    title_components = {
-        'grading': '',  # PSA Grade
-        'card_name': card_data.get('card_name', '').strip(),
-        'variant': [],  # Will hold variant/rarity information
-        'set_name': card_data.get('set', '').strip(),
-        'set_number': card_data.get('card_number', '').strip(),
-        'language': card_data.get('language', 'English'),
-        'franchise': 'Pokemon' if 'POKEMON' in card_data.get('brand', '').upper() else card_data.get('sport', '').strip(),
-        'year': card_data.get('year', '').strip(),
-        'notes': []
-    }
+def _write_psa_data(cert_number, card_data):
+    cert_cache.set(cert_number, card_data)
+    if card_data is not None:
+        cert_store.upsert(card_data)
 
-    # Build grading component
-    grade_parts = []
-    if card_data.get('grade'):
-        grade_parts.append(f"PSA {card_data['grade']}")
-    if card_data.get('qualifier'):
-        grade_parts.append(card_data['qualifier'])
-    if card_data.get('grade_suffix'):
-        grade_parts.append(card_data['grade_suffix'])
-    title_components['grading'] = ' '.join(grade_parts)
-
-    # Extract variant/rarity information
-    variants = []
-    if 'MASTER BALL' in card_data.get('brand', ''):
-        variants.append('MASTER BALL')
-    if card_data.get('variety'):
-        variants.append(card_data['variety'])
-    if 'REVERSE HOLO' in card_data.get('brand', ''):
-        variants.append('REVERSE HOLO')
-    if card_data.get('insert_type'):
-        variants.append(card_data['insert_type'])
-    if card_data.get('parallel_type'):
-        variants.append(card_data['parallel_type'])
-    
-    # Clean up variants
-    title_components['variant'] = [v.strip() for v in variants if v and v.strip()]
-
-    # Build title following the specified order
-    title_parts = []
-    if title_components['grading']:
-        title_parts.append(title_components['grading'])
-    if title_components['card_name']:
-        title_parts.append(title_components['card_name'])
-    if title_components['variant']:
-        title_parts.extend(title_components['variant'])
-    if title_components['set_number']:
-        title_parts.append(title_components['set_number'])
-    if title_components['set_name']:
-        title_parts.append(title_components['set_name'])
-    if title_components['language'] != 'English':
-        title_parts.append(title_components['language'])
-    if title_components['franchise']:
-        title_parts.append(title_components['franchise'])
-    if title_components['year']:
-        title_parts.append(title_components['year'])
-    
-    title = " ".join(title_parts)
-    
-    # Create enhanced description with better formatting and sections
-    description = [
-        f"# {title}",
-        "\n## Card Details"
-    ]
-    
-    details = []
-    if card_data.get('cert_number'):
-        details.append(f"• PSA Certificate: {card_data['cert_number']}")
-    if card_data.get('grade'):
-        grade_info = f"• PSA Grade: {card_data['grade']}"
-        if card_data.get('qualifier'):
-            grade_info += f" ({card_data['qualifier']})"
-        if card_data.get('grade_suffix'):
-            grade_info += f" {card_data['grade_suffix']}"
-        details.append(grade_info)
-    if card_data.get('card_name'):
-        details.append(f"• Card Name: {card_data['card_name']}")
-    if card_data.get('card_number'):
-        details.append(f"• Card Number: {card_data['card_number']}")
-    if card_data.get('year'):
-        details.append(f"• Year: {card_data['year']}")
-    if card_data.get('brand'):
-        details.append(f"• Brand: {card_data['brand']}")
-    if card_data.get('set'):
-        details.append(f"• Set: {card_data['set']}")
-    if title_components['variant']:
-        details.append(f"• Variant: {', '.join(title_components['variant'])}")
-    if card_data.get('language') and card_data['language'] != 'English':
-        details.append(f"• Language: {card_data['language']}")
-    
-    description.extend(details)
-    
-    # Add verification and condition sections
-    description.extend([
-        "\n## Authentication & Grading",
-        f"• PSA Graded {card_data.get('grade', 'N/A')}" + 
-        (f" ({card_data['qualifier']})" if card_data.get('qualifier') else "") +
-        (f" {card_data['grade_suffix']}" if card_data.get('grade_suffix') else ""),
-        f"• Verify this card at PSA's website: https://www.psacard.com/cert/{card_data['cert_number']}",
-        "\n## Shipping & Handling",
-        "• FREE secure shipping with tracking (United States only)",
-        "• Professional packaging with card saver and bubble mailer",
-        "• Full insurance included for your protection",
-        "\n## Seller Notes",
-        "• US-based seller with excellent feedback",
-        "• Fast shipping - typically ships within 1 business day",
-        "• Cards are stored in smoke-free, climate-controlled environment",
-        "\n## Return Policy",
-        "• 30-day returns accepted if item is not as described",
-        "• Buyer pays return shipping",
-        "• Please contact us before returning"
-    ])
+async def persist_psa_data(cert_number, card_data):
+    """Cache and store a PSA result off the event loop; a failed write is logged, not raised,
+    since the caller already has the data"""
+    try:
+        await asyncio.to_thread(_write_psa_data, cert_number, card_data)
+    except Exception:
+        logger.exception(
+            "Failed to persist PSA data for cert #%s", cert_number,
+            extra={"cert_number": cert_number, "stage": "persist"},
+        )
+
+# After a range lookup, the certs just past its end are fetched ahead of the usual follow-up query.
+# Prefetches share in-flight calls with regular lookups so a cert is never requested twice at once.
+prefetcher = RangePrefetcher(
+    fetch=lambda cert_number: psa_singleflight.do(
+        cert_number,
+        lambda promote: fetch_psa_data(cert_number, background=True, promote=promote),
+        background=True,
+    ),
+    peek=cert_cache.peek,
+    span=int(os.getenv("PREFETCH_SPAN", "200")),
+    max_misses=int(os.getenv("PREFETCH_MAX_MISSES", "10")),
+    max_active=int(os.getenv("PREFETCH_MAX_ACTIVE", "2")),
+)
+
+def prefetch_after(cert_input: str):
+    for _, end in cert_ranges(cert_input):
+        prefetcher.schedule(end)
+
+@metrics.listing_generation_seconds.time(mode="single")
+def generate_ebay_listing(card_data, seller: Optional[str] = None):
+    """Generate eBay listing from card data using the seller's compiled listing template"""
+    log_payload("Generating eBay listing for card data", card_data)
     
-    listing = {
-        "title": title,
-        "description": "\n".join(description)
-    }
+    if not card_data:
+        logger.debug("No card data provided")
+        return None
     
-    print(f"Generated listing: {json.dumps(listing, indent=2)}")
+    listing = listing_templates.get(seller).render(card_data)
+    log_payload("Generated listing", listing)
     return listing
 
-@app.post("/api/psa/lookup")
-async def lookup_cert(request: CertRequest):
-    print(f"\nReceived lookup request for cert #{request.cert_number}")
+async def lookup_cert_response(cert_number: str, if_none_match: Optional[str] = None) -> Response:
+    """Single-cert lookup served from the response cache when possible.
+
+    Only GET callers pass If-None-Match: a 304 to a POST isn't a cacheable answer clients expect.
+    """
+    logger.info("Received lookup request for cert #%s", cert_number, extra={"cert_number": cert_number, "stage": "lookup"})
     try:
-        card_data = get_psa_data(request.cert_number)
-        if card_data:
+        entry = lookup_responses.get(cert_number)
+        if entry is None:
+            metrics.lookup_response_cache_requests.inc(result="miss")
+            card_data = await get_psa_data(cert_number)
+            if not card_data:
+                error_msg = f"No data found for cert #{cert_number}"
+                logger.info(error_msg, extra={"cert_number": cert_number, "stage": "lookup"})
+                # The cert may be graded later, so don't let anything hold on to this answer
+                return JSONResponse({"success": False, "error": error_msg}, headers={"Cache-Control": "no-cache"})
             listing = generate_ebay_listing(card_data)
             response_data = {
                 "success": True,
                 "card_data": card_data,
                 "listing": listing
             }
-            print(f"Sending response: {json.dumps(response_data, indent=2)}")
-            return response_data
-        
-        error_msg = f"No data found for cert #{request.cert_number}"
-        print(error_msg)
-        return {"success": False, "error": error_msg}
+            log_payload("Sending response", response_data)
+            entry = lookup_responses.set(cert_number, response_data)
+        else:
+            metrics.lookup_response_cache_requests.inc(result="hit")
+    except UpstreamError as e:
+        raise HTTPException(status_code=503, detail=f"PSA API temporarily unavailable: {str(e)}")
     except Exception as e:
-        error_msg = f"Error processing cert #{request.cert_number}: {str(e)}"
-        print(error_msg)
+        error_msg = f"Error processing cert #{cert_number}: {str(e)}"
+        logger.exception(error_msg, extra={"cert_number": cert_number, "stage": "lookup"})
         raise HTTPException(status_code=500, detail=error_msg)
 
-async def process_cert_numbers(cert_input: str) -> List[str]:
-    """Process cert input string into list of cert numbers"""
-    cert_numbers = []
+    headers = {"ETag": entry.etag, "Cache-Control": LOOKUP_CACHE_CONTROL}
+    if etag_matches(if_none_match, entry.etag):
+        lookup_responses.record_not_modified()
+        metrics.lookup_response_cache_requests.inc(result="not_modified")
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+@router.post("/api/psa/lookup")
+async def lookup_cert(request: CertRequest):
+    return await lookup_cert_response(request.cert_number.strip())
+
+@router.get("/api/psa/lookup/{cert_number}")
+async def get_cert(cert_number: str, if_none_match: Optional[str] = Header(None)):
+    """Cacheable form of /api/psa/lookup: browsers and CDNs can store and revalidate GET responses"""
+    if not cert_number.isdigit():
+        raise HTTPException(status_code=400, detail=f"Invalid certificate number: {cert_number}")
+    return await lookup_cert_response(cert_number, if_none_match)
+
+async def process_cert_numbers(cert_input: str, max_range: int = 100, max_total: Optional[int] = None) -> List[str]:
+    """Process cert input string into list of cert numbers.
+
+    With `max_total`, input covering more distinct certs is rejected as soon as the
+    running total passes it, before the rest is expanded.
+    """
+    cert_numbers = {}  # Keeps input order and drops duplicates
     
     # Remove any whitespace and split by comma
     parts = [p.strip() for p in cert_input.split(',')]
@@ -317,24 +517,24 @@ async def process_cert_numbers(cert_input: str) -> List[str]:
                 start, end = map(int, part.split('-'))
                 if end < start:
                     raise ValueError("End number must be greater than start number")
-                if end - start > 100:
-                    raise ValueError("Maximum range of 100 certificates allowed")
-                cert_numbers.extend(str(num) for num in range(start, end + 1))
+                if end - start > max_range:
+                    raise ValueError(f"Maximum range of {max_range} certificates allowed")
+                cert_numbers.update(dict.fromkeys(str(num) for num in range(start, end + 1)))
             except ValueError as e:
                 raise HTTPException(status_code=400, detail=str(e))
         else:
             # Handle individual number
             try:
                 int(part)  # Validate it's a number
-                cert_numbers.append(part)
+                cert_numbers[part] = None
             except ValueError:
                 raise HTTPException(status_code=400, detail=f"Invalid certificate number: {part}")
+        if max_total is not None and len(cert_numbers) > max_total:
+            raise HTTPException(status_code=400, detail=f"Maximum of {max_total} certificates allowed")
     
-    # Remove duplicates while preserving order
-    return list(dict.fromkeys(cert_numbers))
+    return list(cert_numbers)
 
 async def process_image_with_openai(image_data: str, prompt: str):
-    client = OpenAI(api_key=OPENAI_API_KEY)
     try:
         headers = {
             'Content-Type': 'application/json',
@@ -380,33 +580,34 @@ async def process_image_with_openai(image_data: str, prompt: str):
             "max_tokens": 768
         }
         
-        print("Sending request to OpenAI API...")
-        print(f"Using image URL: {image_url[:100]}...")  # Print first 100 chars of URL
+        logger.debug("Sending request to OpenAI API")
         
-        response = requests.post(
-            'https://api.openai.com/v1/chat/completions',
-            headers=headers,
-            json=payload,
-            timeout=30
-        )
+        with metrics.openai_request_seconds.time():
+            response = await openai_engine.post(
+                f"{OPENAI_API_BASE_URL}/chat/completions",
+                headers=headers,
+                json=payload
+            )
         
-        print(f"Response status: {response.status_code}")
-        print(f"Response headers: {dict(response.headers)}")
+        logger.debug("OpenAI response status: %s", response.status_code)
         
-        if not response.ok:
+        if not response.is_success:
             error_text = response.text
-            print(f"OpenAI API error: {response.status_code} - {error_text}")
+            logger.error(
+                "OpenAI API error: %s - %s", response.status_code, error_text,
+                extra={"stage": "openai", "status_code": response.status_code},
+            )
             raise HTTPException(status_code=response.status_code, detail=f"OpenAI API error: {error_text}")
             
         result = response.json()
-        print(f"OpenAI API response: {json.dumps(result, indent=2)}")
+        log_payload("OpenAI API response", result)
         
         # Extract the content from the response
         if 'choices' not in result or not result['choices']:
             raise ValueError("No choices in OpenAI response")
             
         content = result['choices'][0]['message']['content']
-        print(f"Raw content from OpenAI: {content}")
+        logger.debug("Raw content from OpenAI: %s", content)
         
         try:
             # Try to parse as JSON first
@@ -414,16 +615,19 @@ async def process_image_with_openai(image_data: str, prompt: str):
             cert_numbers = parsed_content.get('cert_numbers', [])
         except json.JSONDecodeError:
             # If not JSON, try to extract numbers directly
-            print("Failed to parse JSON, attempting to extract numbers directly")
+            logger.debug("Failed to parse JSON, attempting to extract numbers directly")
             import re
             # Look for 8 or 9 digit numbers
             cert_numbers = re.findall(r'\b\d{8,9}\b', content)
         
-        print(f"Extracted cert numbers: {cert_numbers}")
+        logger.debug("Extracted cert numbers: %s", cert_numbers)
         
         # Validate the numbers - accept both 8 and 9 digits
         valid_numbers = [num for num in cert_numbers if num.isdigit() and len(num) in [8, 9]]
-        print(f"Valid cert numbers: {valid_numbers}")
+        logger.info(
+            "Valid cert numbers from OpenAI: %s", valid_numbers,
+            extra={"stage": "openai", "cert_numbers": valid_numbers},
+        )
         
         if not valid_numbers:
             raise HTTPException(status_code=400, detail="No valid PSA certification numbers (8-9 digits) found in image")
@@ -431,22 +635,76 @@ async def process_image_with_openai(image_data: str, prompt: str):
         return valid_numbers
         
     except json.JSONDecodeError as e:
-        print(f"JSON decode error: {str(e)}")
-        print(f"Response content: {response.text if 'response' in locals() else 'No response'}")
+        logger.error("Failed to parse OpenAI response: %s", str(e), extra={"stage": "openai"})
         raise HTTPException(status_code=500, detail=f"Failed to parse OpenAI response: {str(e)}")
-    except requests.exceptions.RequestException as e:
-        print(f"Request error: {str(e)}")
+    except HTTPException:
+        raise
+    except UpstreamError as e:
+        logger.error("OpenAI unavailable: %s", str(e), extra={"stage": "openai"})
+        raise HTTPException(status_code=503, detail=f"OpenAI temporarily unavailable: {str(e)}")
+    except httpx.HTTPError as e:
+        logger.error("Request error calling OpenAI: %s", str(e), extra={"stage": "openai"})
         raise HTTPException(status_code=500, detail=f"Error making request to OpenAI: {str(e)}")
     except Exception as e:
-        print(f"Error processing image: {str(e)}")
-        print(f"Full error details: {str(e.__class__.__name__)}: {str(e)}")
+        logger.exception("Error processing image", extra={"stage": "openai"})
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
 
-@app.post("/api/psa/lookup/image")
+async def extract_cert_numbers(image_data: str, prompt: Optional[str], single_slab: bool = False) -> List[str]:
+    """Extract cert numbers from an image: image cache first, then local barcode/OCR, then OpenAI.
+
+    `single_slab` says the photo shows one slab, so one decoded barcode is the whole answer.
+    """
+    namespace = hashlib.sha256((prompt or "").encode()).hexdigest()
+    # Decoding and hashing the image is CPU work, so keep it off the event loop
+    digest, phash = await asyncio.to_thread(fingerprint, image_data, image_cache.near_matches)
+    
+    cert_numbers = image_cache.get(namespace, digest)
+    if cert_numbers is not None:
+        metrics.image_cache_requests.inc(result="hit")
+        logger.debug("Image cache hit: %s", cert_numbers)
+        return cert_numbers
+    
+    cert_numbers = await image_singleflight.do(
+        (namespace, digest), lambda: extract_uncached(image_data, prompt, namespace, digest, phash, single_slab)
+    )
+    return list(cert_numbers)
+
+async def extract_uncached(
+    image_data: str, prompt: Optional[str], namespace: str, digest: str, phash: Optional[int], single_slab: bool = False
+) -> List[str]:
+    """Extraction for an image without an exact cache entry; the result is cached under its digest"""
+    local_numbers, confidence = [], 0.0
+    if LOCAL_OCR_ENABLED and local_ocr.available() and not image_data.startswith('http'):
+        with metrics.local_ocr_seconds.time():
+            local_numbers, confidence = await asyncio.to_thread(
+                local_ocr.extract_cert_numbers_locally, decode_image(image_data), single_slab
+            )
+        logger.debug("Local extraction found %s with confidence %.2f", local_numbers, confidence)
+    
+    # A look-alike photo (same holder and background, possibly another slab) is only
+    # trusted when a local read of this one, even a low-confidence one, agrees with it
+    similar = image_cache.similar(namespace, phash)
+    confirmed = similar is not None and bool(local_numbers) and set(local_numbers) <= set(similar)
+    if similar is not None:
+        image_cache.record("perceptual_hits" if confirmed else "perceptual_rejected")
+    if confirmed:
+        metrics.image_cache_requests.inc(result="hit")
+        cert_numbers = similar
+    else:
+        image_cache.record("misses")
+        metrics.image_cache_requests.inc(result="miss")
+        if local_numbers and confidence >= LOCAL_OCR_MIN_CONFIDENCE:
+            cert_numbers = local_numbers
+        else:
+            cert_numbers = await process_image_with_openai(image_data, prompt)
+    image_cache.set(namespace, digest, phash, cert_numbers)
+    return cert_numbers
+
+@router.post("/api/psa/lookup/image")
 async def lookup_from_image(request: ImageRequest):
     try:
         # Process the image with OpenAI
-        cert_numbers = await process_image_with_openai(request.image, request.prompt)
+        cert_numbers = await extract_cert_numbers(request.image, request.prompt)
         
         if not cert_numbers:
             raise HTTPException(status_code=400, detail="No valid PSA certification numbers found in image")
@@ -459,45 +717,99 @@ async def lookup_from_image(request: ImageRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/psa/lookup/batch")
-async def lookup_cert_range(request: CertRangeRequest):
-    print(f"\nReceived batch lookup request for certs: {request.cert_input}")
+async def lookup_single_cert(cert_num: str, seller: Optional[str] = None) -> dict:
+    """Look up one cert and build its batch result or error entry"""
     try:
-        cert_numbers = await process_cert_numbers(request.cert_input)
-        
-        if len(cert_numbers) > 100:
-            raise HTTPException(status_code=400, detail="Maximum of 100 certificates allowed")
+        card_data = await get_psa_data(cert_num)
+        if card_data:
+            listing = generate_ebay_listing(card_data, seller)
+            return {
+                "cert_number": cert_num,
+                "success": True,
+                "card_data": card_data,
+                "listing": listing
+            }
+        return {
+            "cert_number": cert_num,
+            "error": "No data found"
+        }
+    except UpstreamError as e:
+        # Not a bad cert: the lookup can be retried once PSA recovers
+        return {
+            "cert_number": cert_num,
+            "error": f"PSA API temporarily unavailable: {str(e)}",
+            "retryable": True
+        }
+    except Exception as e:
+        return {
+            "cert_number": cert_num,
+            "error": str(e)
+        }
+
+@router.post("/api/psa/lookup/images")
+async def lookup_from_images(request: MultiImageRequest):
+    """Extract cert numbers from many slab photos in parallel and look them all up in one batch"""
+    logger.info("Received multi-image lookup request with %d images", len(request.images))
+    if not request.images:
+        raise HTTPException(status_code=400, detail="No images provided")
+    if len(request.images) > MAX_IMAGES_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"Maximum of {MAX_IMAGES_PER_REQUEST} images allowed")
+    
+    async def extract(index: int, image: str) -> dict:
+        try:
+            # Each upload is a photo of one slab
+            cert_numbers = await extract_cert_numbers(image, request.prompt, single_slab=True)
+            return {"index": index, "cert_numbers": cert_numbers}
+        except HTTPException as e:
+            return {"index": index, "cert_numbers": [], "error": e.detail}
+    
+    # The OpenAI engine caps how many vision calls run at once
+    images = await asyncio.gather(*(extract(index, image) for index, image in enumerate(request.images)))
+    
+    # Merge and de-duplicate, keeping the order the certs appeared in the uploads
+    cert_numbers = list(dict.fromkeys(num for image in images for num in image["cert_numbers"]))
+    if not cert_numbers:
+        raise HTTPException(status_code=400, detail="No valid PSA certification numbers found in any image")
+    if len(cert_numbers) > MAX_BATCH_CERTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"The images contain {len(cert_numbers)} certificate numbers; "
+                   f"a maximum of {MAX_BATCH_CERTS} can be looked up per request",
+        )
+    
+    batch_request = CertRangeRequest(cert_input=",".join(cert_numbers))
+    response_data = await lookup_cert_range(batch_request)
+    response_data["images"] = images
+    return response_data
+
+@router.post("/api/psa/lookup/batch")
+async def lookup_cert_range(request: CertRangeRequest, http_request: Request = None):
+    logger.info("Received batch lookup request for certs: %s", request.cert_input)
+    if request.compact and request.listing not in compact_response.LISTING_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"listing must be one of: {', '.join(compact_response.LISTING_MODES)}",
+        )
+    try:
+        cert_numbers = await process_cert_numbers(request.cert_input, max_total=MAX_BATCH_CERTS)
         
-        results = []
-        errors = []
+        # Certs are fetched concurrently; the PSA engine bounds parallelism and request rate
+        outcomes = await asyncio.gather(*(lookup_single_cert(cert_num) for cert_num in cert_numbers))
+        if request.compact:
+            payload = compact_response.compact_batch(
+                outcomes, request.fields, request.listing, [listing_templates.get(None).boilerplate]
+            )
+            headers = http_request.headers if http_request is not None else {}
+            body, media_type, encoding_headers = compact_response.encode(
+                payload, headers.get("accept"), headers.get("accept-encoding")
+            )
+            logger.info("Compact batch complete. Success: %d, Failures: %d, %d bytes",
+                        payload["successful"], payload["failed"], len(body))
+            prefetch_after(request.cert_input)
+            return Response(body, media_type=media_type, headers=encoding_headers)
         
-        for cert_num in cert_numbers:
-            try:
-                print(f"Processing cert #{cert_num}")
-                card_data = get_psa_data(cert_num)
-                if card_data:
-                    listing = generate_ebay_listing(card_data)
-                    results.append({
-                        "cert_number": cert_num,
-                        "success": True,
-                        "card_data": card_data,
-                        "listing": listing
-                    })
-                else:
-                    errors.append({
-                        "cert_number": cert_num,
-                        "error": "No data found"
-                    })
-                
-                # Add delay between requests to avoid rate limiting
-                if cert_num != cert_numbers[-1]:
-                    await asyncio.sleep(request.delay)
-                    
-            except Exception as e:
-                errors.append({
-                    "cert_number": cert_num,
-                    "error": str(e)
-                })
+        results = [outcome for outcome in outcomes if outcome.get("success")]
+        errors = [outcome for outcome in outcomes if not outcome.get("success")]
         
         response_data = {
             "success": True,
@@ -508,38 +820,348 @@ async def lookup_cert_range(request: CertRangeRequest):
             "errors": errors
         }
         
-        print(f"Batch processing complete. Success: {len(results)}, Failures: {len(errors)}")
+        logger.info("Batch processing complete. Success: %d, Failures: %d", len(results), len(errors))
+        prefetch_after(request.cert_input)
         return response_data
         
+    except HTTPException:
+        raise
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid certificate numbers provided")
     except Exception as e:
         error_msg = f"Error processing cert range: {str(e)}"
-        print(error_msg)
+        logger.exception(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
-@app.post("/api/psa/submit")
+@router.post("/api/psa/lookup/batch/stream")
+async def lookup_cert_range_stream(request: CertRangeRequest):
+    """Stream batch results as NDJSON, one line per cert as soon as it resolves, then a summary line"""
+    logger.info("Received streaming batch lookup request for certs: %s", request.cert_input)
+    cert_numbers = await process_cert_numbers(request.cert_input, max_total=MAX_BATCH_CERTS)
+    
+    async def stream_results():
+        successful = 0
+        failed = 0
+        async for outcome in psa_engine.imap_unordered(lookup_single_cert, cert_numbers):
+            if outcome.get("success"):
+                successful += 1
+            else:
+                failed += 1
+            yield json.dumps({"type": "cert", **outcome}) + "\n"
+        
+        logger.info("Streaming batch complete. Success: %d, Failures: %d", successful, failed)
+        prefetch_after(request.cert_input)
+        yield json.dumps({
+            "type": "summary",
+            "success": True,
+            "total_processed": len(cert_numbers),
+            "successful": successful,
+            "failed": failed
+        }) + "\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@router.post("/api/psa/jobs")
+async def create_job(request: JobRequest):
+    logger.info("Received job request for certs: %s", request.cert_input)
+    cert_numbers = await process_cert_numbers(request.cert_input, max_range=JOB_MAX_CERTS, max_total=JOB_MAX_CERTS)
+    job = await job_manager.submit(request.cert_input, cert_numbers)
+    return {"success": True, "job": job}
+
+def get_job_or_404(job_id: str) -> dict:
+    job = job_store.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@router.get("/api/psa/jobs/{job_id}")
+async def get_job(job_id: str):
+    return {"success": True, "job": get_job_or_404(job_id)}
+
+@router.get("/api/psa/jobs/{job_id}/results")
+async def get_job_results(job_id: str, offset: int = 0, limit: int = 100):
+    job = get_job_or_404(job_id)
+    limit = max(1, min(limit, 1000))
+    results = job_store.results(job_id, offset=max(0, offset), limit=limit)
+    return {
+        "success": True,
+        "job": job,
+        "offset": offset,
+        "limit": limit,
+        "results": results
+    }
+
+@router.post("/api/psa/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    get_job_or_404(job_id)
+    return {"success": True, "job": job_manager.cancel(job_id)}
+
+@router.post("/api/psa/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    get_job_or_404(job_id)
+    return {"success": True, "job": job_manager.resume(job_id)}
+
+@router.post("/api/listings/render")
+async def render_listings(request: ListingRenderRequest):
+    """Render eBay listings for many card_data records in one call"""
+    if len(request.cards) > MAX_LISTING_BATCH:
+        raise HTTPException(status_code=400, detail=f"Maximum of {MAX_LISTING_BATCH} cards allowed")
+    
+    template = listing_templates.get(request.seller)
+    # Rendering thousands of listings is CPU work, so keep it off the event loop
+    with metrics.listing_generation_seconds.time(mode="bulk"):
+        listings = await asyncio.to_thread(template.render_many, request.cards)
+    return {
+        "success": True,
+        "template": template.name,
+        "total": len(listings),
+        "listings": listings
+    }
+
+@router.get("/api/listings/templates")
+async def list_listing_templates():
+    return {"success": True, "templates": listing_templates.names()}
+
+@router.post("/api/grading/ev")
+async def grading_expected_value(request: GradingEVRequest):
+    """Expected value and best selling method for a whole collection of cards"""
+    if len(request.cards) > MAX_EV_CARDS:
+        raise HTTPException(status_code=400, detail=f"Maximum of {MAX_EV_CARDS} cards allowed")
+    if request.sweep and math.prod(len(shifts) for shifts in request.sweep.values()) > MAX_SWEEP_SCENARIOS:
+        raise HTTPException(status_code=400, detail=f"Maximum of {MAX_SWEEP_SCENARIOS} sweep scenarios allowed")
+    
+    try:
+        import grading_ev  # NumPy is only loaded once grading is used
+        result = await asyncio.to_thread(
+            grading_ev.evaluate_collection,
+            request.cards,
+            request.defaults,
+            request.sweep,
+            request.include_cards,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, **result}
+
+@router.post("/api/grading/simulate")
+async def grading_simulation(request: GradingSimulationRequest):
+    """Monte Carlo profit distribution for grading a whole submission"""
+    if len(request.cards) > MAX_EV_CARDS:
+        raise HTTPException(status_code=400, detail=f"Maximum of {MAX_EV_CARDS} cards allowed")
+    if request.simulations > MAX_SIMULATIONS:
+        raise HTTPException(status_code=400, detail=f"Maximum of {MAX_SIMULATIONS} simulations allowed")
+    if len(request.cards) * request.simulations > MAX_SIMULATION_SAMPLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum of {MAX_SIMULATION_SAMPLES} card simulations allowed (cards x simulations)",
+        )
+    
+    try:
+        import grading_sim  # NumPy is only loaded once grading is used
+        result = await asyncio.to_thread(
+            grading_sim.simulate_submission,
+            request.cards,
+            request.defaults,
+            request.simulations,
+            request.method,
+            SIM_WORKERS,
+            request.seed,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, **result}
+
+def cert_filters(set_name, year, grade, grade_number, brand, sport, subject, language) -> dict:
+    return {
+        "set": set_name,
+        "year": year,
+        "grade": grade,
+        "grade_number": grade_number,
+        "brand": brand,
+        "sport": sport,
+        "subject": subject,
+        "language": language,
+    }
+
+@router.get("/api/certs")
+async def query_certs(
+    set_name: Optional[str] = Query(None, alias="set"),
+    year: Optional[str] = None,
+    grade: Optional[str] = None,
+    grade_number: Optional[float] = None,
+    brand: Optional[str] = None,
+    sport: Optional[str] = None,
+    subject: Optional[str] = None,
+    language: Optional[str] = None,
+    search: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 100,
+):
+    """Certs we have looked up before, filtered on the local indexes"""
+    filters = cert_filters(set_name, year, grade, grade_number, brand, sport, subject, language)
+    limit = max(1, min(limit, 1000))
+    result = cert_store.query(filters, search=search, offset=max(0, offset), limit=limit)
+    return {"success": True, "offset": offset, "limit": limit, **result}
+
+@router.get("/api/certs/population")
+async def cert_population(
+    group_by: str = "set,grade_number",
+    set_name: Optional[str] = Query(None, alias="set"),
+    year: Optional[str] = None,
+    grade: Optional[str] = None,
+    grade_number: Optional[float] = None,
+    brand: Optional[str] = None,
+    sport: Optional[str] = None,
+    subject: Optional[str] = None,
+    language: Optional[str] = None,
+    search: Optional[str] = None,
+):
+    """Counts of looked-up certs grouped by comma-separated columns, e.g. grade population by set"""
+    filters = cert_filters(set_name, year, grade, grade_number, brand, sport, subject, language)
+    try:
+        groups = cert_store.population([name.strip() for name in group_by.split(",") if name.strip()], filters, search=search)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "group_by": group_by, "groups": groups}
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def export_response(lines, output: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        lines,
+        media_type=EXPORT_MEDIA_TYPES[output],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{output}"'},
+    )
+
+@router.post("/api/psa/import")
+async def import_cert_list(
+    request: Request,
+    input_format: Optional[str] = Query(None, alias="format"),
+    output: str = "ndjson",
+    column: Optional[str] = None,
+    seller: Optional[str] = None,
+):
+    """Look up every cert in an uploaded CSV or NDJSON file, streaming results back as CSV or NDJSON.
+    
+    The request body is the raw file. Certs are parsed and looked up incrementally, so memory
+    use does not grow with the file; the CSV output is ready for eBay bulk upload.
+    """
+    input_format = input_format or bulk_io.detect_format(request.headers.get("content-type"))
+    if input_format not in EXPORT_MEDIA_TYPES or output not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Formats must be one of: csv, ndjson")
+    logger.info("Received %s cert import, responding with %s", input_format, output)
+    
+    # Spool the upload first so the response can stream while the file is parsed
+    upload = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES)
+    async for chunk in request.stream():
+        upload.write(chunk)
+    upload.seek(0)
+    
+    cert_numbers = bulk_io.iter_cert_numbers(bulk_io.iter_file(upload), input_format, column)
+    try:
+        first = await cert_numbers.__anext__()
+    except StopAsyncIteration:
+        upload.close()
+        raise HTTPException(status_code=400, detail="No certificate numbers found in upload")
+    except ValueError as e:
+        upload.close()
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def all_cert_numbers():
+        yield first
+        async for cert_number in cert_numbers:
+            yield cert_number
+    
+    async def lines():
+        try:
+            lookup = functools.partial(lookup_single_cert, seller=seller)
+            outcomes = psa_engine.imap_unordered(lookup, all_cert_numbers())
+            async for line in bulk_io.encode_outcomes(outcomes, output):
+                yield line
+        finally:
+            upload.close()
+    
+    return export_response(lines(), output, "psa-import")
+
+@router.get("/api/psa/jobs/{job_id}/export")
+async def export_job_results(job_id: str, output: str = Query("csv", alias="format")):
+    """Stream a job's completed results as an eBay bulk upload CSV or as NDJSON"""
+    get_job_or_404(job_id)
+    if output not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Format must be one of: csv, ndjson")
+    outcomes = bulk_io.iter_async(job_store.iter_results(job_id))
+    return export_response(bulk_io.encode_outcomes(outcomes, output), output, f"psa-job-{job_id}")
+
+@router.get("/api/psa/cache/stats")
+async def cache_stats():
+    return cert_cache.stats()
+
+@router.get("/api/psa/cache/responses/stats")
+async def response_cache_stats():
+    return lookup_responses.stats()
+
+@router.get("/api/psa/cache/prefetch/stats")
+async def prefetch_stats():
+    return prefetcher.stats()
+
+@router.get("/api/psa/cache/image/stats")
+async def image_cache_stats():
+    return image_cache.stats()
+
+@router.post("/api/psa/submit")
 async def submit_consignment(request: ConsignmentRequest):
-    print(f"\nReceived consignment request from {request.name} ({request.email})")
+    logger.info("Received consignment request from %s (%s)", request.name, request.email)
     try:
-        # Here you would typically:
-        # 1. Save the submission to a database
-        # 2. Send an email notification
-        # 3. Generate a tracking number
-        
-        # For now, we'll just log it and return a success message
-        print(f"Submission details: {json.dumps(request.dict(), indent=2)}")
-        
-        # Generate a simple tracking number
-        tracking_number = f"CON-{request.cert_range['start']}-{request.cert_range['end']}-{int(time.time())}"
+        log_payload("Submission details", request.dict())
+        consignment = consignment_store.submit(
+            request.name,
+            request.email,
+            request.notes,
+            request.cert_range,
+            request.results,
+        )
+        logger.info("Consignment %s queued with %d cards", consignment["tracking_number"], consignment["total"])
         
         return {
             "success": True,
-            "tracking_number": tracking_number,
+            "tracking_number": consignment["tracking_number"],
             "message": "Your submission has been received and will be reviewed shortly."
         }
         
     except Exception as e:
         error_msg = f"Error processing submission: {str(e)}"
-        print(error_msg)
-        raise HTTPException(status_code=500, detail=error_msg) 
\ No newline at end of file
+        logger.exception(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.get("/api/consignments")
+async def list_consignments(email: str, offset: int = 0, limit: int = 50):
+    """Consignment submissions made with an email address, newest first"""
+    limit = max(1, min(limit, 500))
+    consignments = await asyncio.to_thread(consignment_store.find_by_email, email, max(0, offset), limit)
+    return {"success": True, "consignments": consignments}
+
+@router.get("/api/consignments/{tracking_number}")
+async def get_consignment(tracking_number: str):
+    consignment = await asyncio.to_thread(consignment_store.get, tracking_number.strip().upper())
+    if consignment is None:
+        raise HTTPException(status_code=404, detail="Consignment not found")
+    return {"success": True, "consignment": consignment}
+
+app = FastAPI(lifespan=lifespan)
+
+# Configure CORS with specific settings
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["https://collectiq.tech", "http://localhost:5173"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization", "Accept", "If-None-Match"],
+    expose_headers=["*"],
+    max_age=3600,
+    allow_credentials=False
+)
+app.middleware("http")(record_request_timing)
+app.include_router(router)
@@ -0,0 +1,79 @@
+"""Throughput of the Monte Carlo grading simulator as the process pool grows.
+
+Run from the backend directory:
+
+    python benchmarks/bench_grading_sim.py --cards 100 --simulations 2000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import grading_sim
+
+# Same defaults as the calculator page
+DEFAULTS = {
+    "gradingFee": 17,
+    "ebayFee": 13.25,
+    "ebayShipping": 5,
+    "resellerPercent": 75,
+    "resellerShipping": 0.5,
+    "consignerHighPercent": 88,
+    "consignerLowExtra": 5,
+    "consignerFlatFee": 5.99,
+}
+
+
+def make_cards(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    cards = []
+    for _ in range(count):
+        psa10 = float(rng.uniform(50, 500))
+        psa10_rate = float(rng.uniform(10, 60))
+        cards.append({
+            "rawPrice": psa10 * float(rng.uniform(0.2, 0.5)),
+            "psa10Price": psa10,
+            "psa9Price": psa10 * 0.55,
+            "psa8Price": psa10 * 0.35,
+            "psa10Rate": psa10_rate,
+            "psa9Rate": float(rng.uniform(0, 100 - psa10_rate) * 0.6),
+            "psa8Rate": 5,
+        })
+    return cards
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=100)
+    parser.add_argument("--simulations", type=int, default=2_000_000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cards = make_cards(args.cards)
+    worker_counts = sorted({1, *[2 ** i for i in range(1, args.max_workers.bit_length())], args.max_workers})
+    print(f"{args.cards} cards, {args.simulations:,} simulations, best of {args.repeat}")
+    print(f"{'workers':>8} {'seconds':>9} {'sims/sec':>14} {'card-samples/sec':>18} {'speedup':>8}")
+
+    baseline = None
+    for workers in worker_counts:
+        # Warm the pool so process start-up is not counted
+        grading_sim.simulate_submission(cards, DEFAULTS, simulations=workers, workers=workers, seed=0)
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            grading_sim.simulate_submission(cards, DEFAULTS, simulations=args.simulations, workers=workers, seed=1)
+            best = min(best, time.perf_counter() - start)
+        baseline = baseline or best
+        rate = args.simulations / best
+        print(f"{workers:>8} {best:>9.3f} {rate:>14,.0f} {rate * args.cards:>18,.0f} {baseline / best:>7.2f}x")
+
+    grading_sim.shutdown_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""Load test of the lookup endpoints, reporting latency percentiles and certs/sec.
+
+Run from the backend directory. With --spawn the PSA/OpenAI stand-ins and a
+backend instance (with a fresh data directory) are started for the run:
+
+    python benchmarks/bench_load.py --spawn --endpoint all --concurrency 20 --requests 200
+
+Without --spawn, point --url at a backend that is already running. Backend
+settings such as PSA_RATE_LIMIT are read from the environment as usual, so the
+effect of a change can be compared run against run.
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ("lookup", "batch", "image")
+IMAGE_PROMPT = 'Extract all PSA certification numbers (8 or 9 digits) as JSON: {"cert_numbers": [...]}'
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class CertSource:
+    """Hands out cert numbers: fresh ones by default, or a small repeating pool to exercise the caches"""
+
+    def __init__(self, start: int, pool: int = 0):
+        self.next = start
+        self.start = start
+        self.pool = pool
+
+    def take(self, count: int):
+        certs = []
+        for _ in range(count):
+            certs.append(str(self.next))
+            self.next += 1
+            if self.pool and self.next >= self.start + self.pool:
+                self.next = self.start
+        return certs
+
+
+def build_request(endpoint: str, certs: CertSource, batch_size: int, rng: random.Random):
+    """(path, json body, certs requested) for one request; image requests count the certs found"""
+    if endpoint == "lookup":
+        return "/api/psa/lookup", {"cert_number": certs.take(1)[0]}, 1
+    if endpoint == "batch":
+        return "/api/psa/lookup/batch", {"cert_input": ",".join(certs.take(batch_size))}, batch_size
+    # Random bytes stand in for a slab photo; each one is unique so the image cache misses
+    image = base64.b64encode(rng.randbytes(2048)).decode()
+    return "/api/psa/lookup/image", {"image": image, "prompt": IMAGE_PROMPT}, 0
+
+
+def certs_in_response(endpoint: str, body: dict, requested: int) -> int:
+    if endpoint == "lookup":
+        return requested
+    return int(body.get("total_processed", requested))
+
+
+async def run_endpoint(client: httpx.AsyncClient, endpoint: str, args, certs: CertSource) -> dict:
+    rng = random.Random(args.seed)
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(build_request(endpoint, certs, args.batch_size, rng))
+
+    latencies = []
+    errors = 0
+    cert_count = 0
+
+    async def worker():
+        nonlocal errors, cert_count
+        while not queue.empty():
+            path, body, requested = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                ok = response.status_code == 200
+                if ok:
+                    cert_count += certs_in_response(endpoint, response.json(), requested)
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "endpoint": endpoint,
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "requests_per_sec": len(latencies) / elapsed,
+        "certs_per_sec": cert_count / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else 0.0,
+    }
+
+
+def print_report(results):
+    print(f"{'endpoint':>8} {'requests':>9} {'errors':>7} {'req/sec':>9} {'certs/sec':>10} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for r in results:
+        print(f"{r['endpoint']:>8} {r['requests']:>9} {r['errors']:>7} {r['requests_per_sec']:>9.1f} "
+              f"{r['certs_per_sec']:>10.1f} {r['p50'] * 1000:>9.1f} {r['p95'] * 1000:>9.1f} "
+              f"{r['p99'] * 1000:>9.1f} {r['max'] * 1000:>9.1f}")
+
+
+async def wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+                await asyncio.sleep(0.2)
+
+
+@contextlib.contextmanager
+def spawned_servers(args):
+    """Start the stand-in upstreams and a backend wired to them, stopping both afterwards"""
+    stub_args = [
+        "--port", str(args.stub_port),
+        "--latency", str(args.psa_latency),
+        "--openai-latency", str(args.openai_latency),
+        "--throttle-rate", str(args.throttle_rate),
+        "--rate-limit", str(args.psa_rate_limit),
+        "--seed", str(args.seed),
+    ]
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = {
+            **os.environ,
+            "PSA_API_BASE_URL": f"http://127.0.0.1:{args.stub_port}/publicapi",
+            "OPENAI_API_BASE_URL": f"http://127.0.0.1:{args.stub_port}/v1",
+            "PSA_API_TOKEN": os.environ.get("PSA_API_TOKEN") or "benchmark",
+            "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY") or "benchmark",
+            "DATA_DIR": data_dir,
+            "LOCAL_OCR_ENABLED": "false",
+            "LOG_LEVEL": os.environ.get("LOG_LEVEL", "WARNING"),
+        }
+        processes = [
+            subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, "benchmarks", "stub_servers.py"), *stub_args],
+                             cwd=BACKEND_DIR, env=env),
+            subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.port),
+                              "--log-level", "warning"], cwd=BACKEND_DIR, env=env),
+        ]
+        try:
+            asyncio.run(wait_until_up(f"http://127.0.0.1:{args.stub_port}/docs"))
+            asyncio.run(wait_until_up(f"http://127.0.0.1:{args.port}/metrics"))
+            yield f"http://127.0.0.1:{args.port}"
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=10)
+
+
+async def run(url: str, args):
+    endpoints = ENDPOINTS if args.endpoint == "all" else (args.endpoint,)
+    certs = CertSource(args.cert_start, args.cert_pool)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        return [await run_endpoint(client, endpoint, args, certs) for endpoint in endpoints]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Backend to test when not spawning one")
+    parser.add_argument("--spawn", action="store_true", help="Start stand-in upstreams and a fresh backend")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the spawned backend")
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--endpoint", choices=(*ENDPOINTS, "all"), default="all")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint")
+    parser.add_argument("--batch-size", type=int, default=20, help="Certs per batch request")
+    parser.add_argument("--cert-start", type=int, default=40000000)
+    parser.add_argument("--cert-pool", type=int, default=0,
+                        help="Cycle through this many certs instead of always using new ones (cache-hit runs)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--psa-latency", type=float, default=0.1)
+    parser.add_argument("--openai-latency", type=float, default=1.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--psa-rate-limit", type=float, default=0.0,
+                        help="Requests/sec the stand-in PSA API allows before answering 429 (0 = unlimited)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests per endpoint, concurrency {args.concurrency}, batch size {args.batch_size}")
+    if args.spawn:
+        with spawned_servers(args) as url:
+            results = asyncio.run(run(url, args))
+    else:
+        results = asyncio.run(run(args.url, args))
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Offline stand-ins for the PSA public API and OpenAI chat completions.
+
+Serves both upstreams from one process so the backend can be load tested without
+real credentials. Run from the backend directory:
+
+    python benchmarks/stub_servers.py --port 9100 --latency 0.15 --rate-limit 10
+
+then start the backend with
+
+    PSA_API_BASE_URL=http://127.0.0.1:9100/publicapi
+    OPENAI_API_BASE_URL=http://127.0.0.1:9100/v1
+
+Responses are derived from the cert number (or the image bytes), so repeated runs
+see the same cards, 404s and extracted cert numbers.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+SETS = (
+    ("Pokemon", "Pokemon Game", "Base Set", ("Charizard-Holo", "Blastoise-Holo", "Pikachu")),
+    ("Pokemon", "Pokemon Japanese", "Vstar Universe", ("Giratina V-Special Art", "Mew ex")),
+    ("Baseball", "Topps", "Chrome", ("Shohei Ohtani", "Mike Trout")),
+    ("Basketball", "Panini", "Prizm", ("LeBron James", "Victor Wembanyama")),
+)
+GRADES = ("GEM MT 10", "MINT 9", "NM-MT 8", "NM 7")
+VARIETIES = ("", "", "1st Edition", "Refractor", "Silver Prizm")
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.1
+    jitter: float = 0.05
+    not_found_rate: float = 0.05
+    throttle_rate: float = 0.0
+    rate_limit: float = 0.0
+    error_rate: float = 0.0
+    root_level_rate: float = 0.1
+    openai_latency: float = 1.0
+    certs_per_image: int = 3
+    seed: int = 0
+
+
+def _fraction(*parts) -> float:
+    """Stable pseudo-random number in [0, 1) for the given key"""
+    digest = hashlib.sha256(":".join(str(part) for part in parts).encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def _pick(options, *parts):
+    return options[int(_fraction(*parts) * len(options))]
+
+
+def psa_cert(cert_number: str, seed: int = 0) -> dict:
+    sport, brand, set_name, subjects = _pick(SETS, seed, cert_number, "set")
+    return {
+        "CertNumber": cert_number,
+        "Year": str(1999 + int(_fraction(seed, cert_number, "year") * 26)),
+        "Brand": brand,
+        "Sport": sport,
+        "Set": set_name,
+        "Subject": _pick(subjects, seed, cert_number, "subject"),
+        "CardNumber": str(1 + int(_fraction(seed, cert_number, "number") * 200)),
+        "Grade": _pick(GRADES, seed, cert_number, "grade"),
+        "Variety": _pick(VARIETIES, seed, cert_number, "variety"),
+        "Language": "Japanese" if "Japanese" in brand else "English",
+    }
+
+
+def create_app(config: StubConfig) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(config.seed)
+    recent = deque()
+
+    def over_rate_limit() -> bool:
+        """Sliding one-second window, like a per-token quota on the real API"""
+        if not config.rate_limit:
+            return False
+        now = time.monotonic()
+        while recent and now - recent[0] > 1.0:
+            recent.popleft()
+        if len(recent) >= config.rate_limit:
+            return True
+        recent.append(now)
+        return False
+
+    async def delay(base: float):
+        await asyncio.sleep(max(0.0, base + rng.uniform(-config.jitter, config.jitter)))
+
+    @app.get("/publicapi/cert/GetByCertNumber/{cert_number}")
+    async def get_by_cert_number(cert_number: str):
+        if over_rate_limit():
+            return JSONResponse({"Message": "Rate limit exceeded"}, status_code=429, headers={"Retry-After": "1"})
+        await delay(config.latency)
+        # Throttling and server errors are random per request, so a retry can succeed
+        if rng.random() < config.throttle_rate:
+            return JSONResponse({"Message": "Too many requests"}, status_code=429, headers={"Retry-After": "1"})
+        if rng.random() < config.error_rate:
+            return JSONResponse({"Message": "Service unavailable"}, status_code=503)
+        if not cert_number.isdigit() or _fraction(config.seed, cert_number, "missing") < config.not_found_rate:
+            return JSONResponse({"Message": "No data found"}, status_code=404)
+        cert = psa_cert(cert_number, config.seed)
+        if _fraction(config.seed, cert_number, "shape") < config.root_level_rate:
+            return cert
+        return {"PSACert": cert, "DNAListing": None}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.body()
+        await delay(config.openai_latency)
+        # The same image always "contains" the same cert numbers
+        digest = hashlib.sha256(body).hexdigest()
+        cert_numbers = [
+            str(10_000_000 + int(_fraction(config.seed, digest, index) * 89_999_999))
+            for index in range(config.certs_per_image)
+        ]
+        return {
+            "id": f"chatcmpl-{digest[:24]}",
+            "object": "chat.completion",
+            "model": "gpt-4o",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": json.dumps({"cert_numbers": cert_numbers})},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 850, "completion_tokens": 30, "total_tokens": 880},
+        }
+
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=StubConfig.latency, help="PSA response time in seconds")
+    parser.add_argument("--jitter", type=float, default=StubConfig.jitter)
+    parser.add_argument("--not-found-rate", type=float, default=StubConfig.not_found_rate)
+    parser.add_argument("--throttle-rate", type=float, default=StubConfig.throttle_rate, help="Fraction of 429s")
+    parser.add_argument("--rate-limit", type=float, default=StubConfig.rate_limit,
+                        help="Requests/sec allowed before answering 429 (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=StubConfig.error_rate, help="Fraction of 503s")
+    parser.add_argument("--root-level-rate", type=float, default=StubConfig.root_level_rate,
+                        help="Fraction of certs answered without the PSACert wrapper")
+    parser.add_argument("--openai-latency", type=float, default=StubConfig.openai_latency)
+    parser.add_argument("--certs-per-image", type=int, default=StubConfig.certs_per_image)
+    parser.add_argument("--seed", type=int, default=StubConfig.seed)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import uvicorn
+
+    args = parse_args(argv)
+    config = StubConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        not_found_rate=args.not_found_rate,
+        throttle_rate=args.throttle_rate,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate,
+        root_level_rate=args.root_level_rate,
+        openai_latency=args.openai_latency,
+        certs_per_image=args.certs_per_image,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+import asyncio
+import codecs
+import csv
+import io
+import itertools
+import json
+import logging
+import re
+from typing import AsyncIterator, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+CERT_NUMBER_PATTERN = re.compile(r'^\d{1,10}$')
+CERT_COLUMN_NAMES = ("cert_number", "cert", "cert number", "certification number", "cert #", "psa cert")
+
+
+def _file_exchange(field: str):
+    return lambda outcome: outcome["listing"]["file_exchange"][field]
+
+
+# Columns for eBay File Exchange bulk listing uploads, followed by the raw card fields.
+# Price, location and business policies come from the seller's listing template; any left
+# blank there must be filled in before the sheet is uploaded.
+EBAY_CSV_COLUMNS = (
+    ("*Action(SiteID=US|Country=US|Currency=USD|Version=1193)", lambda outcome: "Add"),
+    ("CustomLabel", lambda outcome: outcome["cert_number"]),
+    ("*Category", _file_exchange("category_id")),
+    ("*Title", lambda outcome: outcome["listing"]["title"]),
+    ("*Description", lambda outcome: outcome["listing"]["description"]),
+    ("*ConditionID", lambda outcome: "2750"),  # eBay's "Graded" condition for trading cards
+    ("*StartPrice", _file_exchange("start_price")),
+    ("*Quantity", _file_exchange("quantity")),
+    ("*Format", _file_exchange("format")),
+    ("*Duration", _file_exchange("duration")),
+    ("*Location", _file_exchange("location")),
+    ("ShippingProfileName", _file_exchange("shipping_profile")),
+    ("ReturnProfileName", _file_exchange("return_profile")),
+    ("PaymentProfileName", _file_exchange("payment_profile")),
+    ("C:Professional Grader", lambda outcome: "Professional Sports Authenticator (PSA)"),
+    ("C:Grade", lambda outcome: outcome["card_data"].get("grade", "")),
+    ("C:Certification Number", lambda outcome: outcome["cert_number"]),
+    ("Year", lambda outcome: outcome["card_data"].get("year", "")),
+    ("Brand", lambda outcome: outcome["card_data"].get("brand", "")),
+    ("Set", lambda outcome: outcome["card_data"].get("set", "")),
+    ("CardNumber", lambda outcome: outcome["card_data"].get("card_number", "")),
+    ("Subject", lambda outcome: outcome["card_data"].get("player", "")),
+    ("Variants", lambda outcome: ", ".join(outcome["card_data"].get("variants", []))),
+)
+
+
+async def iter_file(file, chunk_size: int = 65536) -> AsyncIterator[bytes]:
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines without holding more than one partial line"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+def _clean(value) -> Optional[str]:
+    value = str(value).strip() if value is not None else ""
+    return value if CERT_NUMBER_PATTERN.match(value) else None
+
+
+class _LineFeed:
+    """Blocking line iterator for a csv.reader in a worker thread, pulling each line from an async source on the loop"""
+
+    def __init__(self, lines: AsyncIterator[str], loop: asyncio.AbstractEventLoop):
+        self.lines = lines.__aiter__()
+        self.loop = loop
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        try:
+            line = asyncio.run_coroutine_threadsafe(self.lines.__anext__(), self.loop).result()
+        except StopAsyncIteration:
+            raise StopIteration
+        # iter_lines drops line endings; a newline inside a quoted cell is part of its value
+        return line + "\n"
+
+
+async def iter_csv_rows(lines: AsyncIterator[str], rows_per_read: int = 500) -> AsyncIterator[list]:
+    """Parse CSV rows with one reader, so quoted cells may span lines (e.g. multi-line notes).
+
+    The reader runs in a worker thread and pulls lines as it needs them, so it alone
+    decides where each record ends; blank rows are skipped.
+    """
+    reader = csv.reader(_LineFeed(lines, asyncio.get_running_loop()))
+    while True:
+        rows = await asyncio.to_thread(lambda: list(itertools.islice(reader, rows_per_read)))
+        if not rows:
+            return
+        for row in rows:
+            if any(cell.strip() for cell in row):
+                yield row
+
+
+async def iter_csv_cert_numbers(lines: AsyncIterator[str], column: Optional[str] = None) -> AsyncIterator[str]:
+    """Cert numbers from a CSV, taken from `column`, a recognised cert header, or the first column"""
+    index = None
+    async for row in iter_csv_rows(lines):
+        if index is None:
+            headers = [cell.strip().lower() for cell in row]
+            if column is not None:
+                if column.lower() not in headers:
+                    raise ValueError(f"Column '{column}' not found in CSV header")
+                index = headers.index(column.lower())
+                continue
+            matches = [i for i, header in enumerate(headers) if header in CERT_COLUMN_NAMES]
+            if matches:
+                index = matches[0]
+                continue
+            # No header row: certs are in the first column
+            index = 0
+        if index < len(row):
+            cert_number = _clean(row[index])
+            if cert_number:
+                yield cert_number
+
+
+async def iter_ndjson_cert_numbers(lines: AsyncIterator[str], column: Optional[str] = None) -> AsyncIterator[str]:
+    """Cert numbers from NDJSON lines holding either objects or bare numbers"""
+    key = column or "cert_number"
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            logger.warning("Skipping invalid NDJSON line: %s", line[:100])
+            continue
+        value = record.get(key) if isinstance(record, dict) else record
+        cert_number = _clean(value)
+        if cert_number:
+            yield cert_number
+
+
+def iter_cert_numbers(chunks: AsyncIterator[bytes], fmt: str, column: Optional[str] = None) -> AsyncIterator[str]:
+    lines = iter_lines(chunks)
+    if fmt == "csv":
+        return iter_csv_cert_numbers(lines, column)
+    if fmt == "ndjson":
+        return iter_ndjson_cert_numbers(lines, column)
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+def detect_format(content_type: Optional[str]) -> str:
+    content_type = (content_type or "").lower()
+    if "json" in content_type:
+        return "ndjson"
+    return "csv"
+
+
+def _csv_line(values: Iterable) -> str:
+    out = io.StringIO()
+    csv.writer(out).writerow(values)
+    return out.getvalue()
+
+
+def csv_header() -> str:
+    return _csv_line(name for name, _ in EBAY_CSV_COLUMNS)
+
+
+def csv_row(outcome: dict) -> Optional[str]:
+    """eBay bulk upload row for a successful lookup; failed lookups have no listing and are skipped"""
+    if not outcome.get("success"):
+        return None
+    return _csv_line(value(outcome) for _, value in EBAY_CSV_COLUMNS)
+
+
+def ndjson_line(record: dict) -> str:
+    return json.dumps(record) + "\n"
+
+
+async def encode_outcomes(outcomes: AsyncIterator[dict], fmt: str) -> AsyncIterator[str]:
+    """Serialize lookup outcomes one at a time; NDJSON ends with a summary record"""
+    successful = 0
+    failed = 0
+    if fmt == "csv":
+        yield csv_header()
+    async for outcome in outcomes:
+        if outcome.get("success"):
+            successful += 1
+        else:
+            failed += 1
+        if fmt == "csv":
+            row = csv_row(outcome)
+            if row:
+                yield row
+        else:
+            yield ndjson_line({"type": "cert", **outcome})
+    if fmt != "csv":
+        yield ndjson_line({
+            "type": "summary",
+            "success": True,
+            "total_processed": successful + failed,
+            "successful": successful,
+            "failed": failed,
+        })
+
+
+async def iter_async(items: Iterable) -> AsyncIterator:
+    for item in items:
+        yield item
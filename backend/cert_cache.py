@@ -0,0 +1,131 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class CertCache:
+    """Two-tier cert result cache: a bounded in-process LRU in front of a SQLite store.
+
+    A cached value of None records that PSA had no data for the cert (negative
+    result); those entries use the shorter negative TTL.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl: float = 30 * 86400, negative_ttl: float = 86400):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0,
+        }
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS cert_cache ("
+            "cert_number TEXT PRIMARY KEY, card_data TEXT, expires_at REAL NOT NULL)"
+        )
+        self.db.commit()
+
+    def _remember(self, cert_number: str, card_data: Optional[dict], expires_at: float):
+        self.memory[cert_number] = (card_data, expires_at)
+        self.memory.move_to_end(cert_number)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def get(self, cert_number: str) -> Tuple[bool, Optional[dict]]:
+        """Return (found, card_data); card_data is None for cached negative results"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(cert_number)
+            if entry is not None:
+                card_data, expires_at = entry
+                if expires_at > now:
+                    self.memory.move_to_end(cert_number)
+                    self.counters["memory_hits"] += 1
+                    if card_data is None:
+                        self.counters["negative_hits"] += 1
+                        return True, None
+                    return True, dict(card_data)
+                del self.memory[cert_number]
+
+            row = self.db.execute(
+                "SELECT card_data, expires_at FROM cert_cache WHERE cert_number = ?",
+                (cert_number,),
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self.counters["misses"] += 1
+                return False, None
+
+            card_data = json.loads(row[0]) if row[0] is not None else None
+            self._remember(cert_number, card_data, row[1])
+            self.counters["disk_hits"] += 1
+            if card_data is None:
+                self.counters["negative_hits"] += 1
+                return True, None
+            return True, dict(card_data)
+
+    def peek(self, cert_number: str) -> Tuple[bool, Optional[dict]]:
+        """Like get, but without counting the lookup or promoting the entry (for background work)"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(cert_number)
+            if entry is not None and entry[1] > now:
+                return True, entry[0]
+            row = self.db.execute(
+                "SELECT card_data, expires_at FROM cert_cache WHERE cert_number = ?",
+                (cert_number,),
+            ).fetchone()
+        if row is None or row[1] <= now:
+            return False, None
+        return True, json.loads(row[0]) if row[0] is not None else None
+
+    def set(self, cert_number: str, card_data: Optional[dict]):
+        """Cache card data for a cert, or None to record that PSA had no data"""
+        ttl = self.ttl if card_data is not None else self.negative_ttl
+        expires_at = time.time() + ttl
+        payload = json.dumps(card_data) if card_data is not None else None
+        with self.lock:
+            self._remember(cert_number, card_data, expires_at)
+            self.db.execute(
+                "INSERT OR REPLACE INTO cert_cache (cert_number, card_data, expires_at) VALUES (?, ?, ?)",
+                (cert_number, payload, expires_at),
+            )
+            self.db.commit()
+            self.counters["writes"] += 1
+
+    def purge_expired(self) -> int:
+        """Delete expired rows from the SQLite store"""
+        with self.lock:
+            cursor = self.db.execute("DELETE FROM cert_cache WHERE expires_at <= ?", (time.time(),))
+            self.db.commit()
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self.memory)
+            stats["disk_entries"] = self.db.execute("SELECT COUNT(*) FROM cert_cache").fetchone()[0]
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        with self.lock:
+            self.db.close()
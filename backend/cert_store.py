@@ -0,0 +1,157 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Query parameter -> indexed column
+FILTER_COLUMNS = {
+    "set": "set_name",
+    "year": "year",
+    "grade": "grade",
+    "grade_number": "grade_number",
+    "brand": "brand",
+    "sport": "sport",
+    "subject": "subject",
+    "language": "language",
+}
+GROUP_COLUMNS = ("set", "year", "grade", "grade_number", "brand", "sport", "subject", "language")
+
+GRADE_NUMBER_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*$')
+
+
+def grade_number(grade) -> Optional[float]:
+    """Numeric grade from PSA grade text such as 'GEM MT 10' or 'NM-MT 8'"""
+    match = GRADE_NUMBER_PATTERN.search(str(grade or ''))
+    return float(match.group(1)) if match else None
+
+
+class CertStore:
+    """Local SQLite record of every cert looked up, indexed for inventory and population queries"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS certs (
+                cert_number TEXT PRIMARY KEY,
+                year TEXT COLLATE NOCASE,
+                brand TEXT COLLATE NOCASE,
+                set_name TEXT COLLATE NOCASE,
+                grade TEXT COLLATE NOCASE,
+                grade_number REAL,
+                subject TEXT COLLATE NOCASE,
+                sport TEXT COLLATE NOCASE,
+                language TEXT COLLATE NOCASE,
+                card_data TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_certs_set_grade ON certs (set_name, grade_number);
+            CREATE INDEX IF NOT EXISTS idx_certs_year ON certs (year);
+            CREATE INDEX IF NOT EXISTS idx_certs_grade_number ON certs (grade_number);
+            CREATE INDEX IF NOT EXISTS idx_certs_grade ON certs (grade);
+            CREATE INDEX IF NOT EXISTS idx_certs_subject ON certs (subject);
+            CREATE INDEX IF NOT EXISTS idx_certs_brand ON certs (brand);
+            """
+        )
+        self.db.commit()
+
+    def _row(self, card_data: dict, now: float) -> tuple:
+        return (
+            str(card_data['cert_number']),
+            card_data.get('year') or None,
+            card_data.get('brand') or None,
+            card_data.get('set') or None,
+            card_data.get('grade') or None,
+            grade_number(card_data.get('grade')),
+            card_data.get('player') or card_data.get('card_name') or None,
+            card_data.get('sport') or None,
+            card_data.get('language') or None,
+            json.dumps(card_data),
+            now,
+            now,
+        )
+
+    def upsert_many(self, records: List[dict]):
+        """Insert or refresh card_data records, keeping when each cert was first seen"""
+        now = time.time()
+        rows = [self._row(card_data, now) for card_data in records if card_data and card_data.get('cert_number')]
+        if not rows:
+            return
+        with self.lock:
+            self.db.executemany(
+                """
+                INSERT INTO certs (cert_number, year, brand, set_name, grade, grade_number, subject, sport,
+                                   language, card_data, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (cert_number) DO UPDATE SET
+                    year = excluded.year, brand = excluded.brand, set_name = excluded.set_name,
+                    grade = excluded.grade, grade_number = excluded.grade_number, subject = excluded.subject,
+                    sport = excluded.sport, language = excluded.language, card_data = excluded.card_data,
+                    last_seen = excluded.last_seen
+                """,
+                rows,
+            )
+            self.db.commit()
+
+    def upsert(self, card_data: dict):
+        self.upsert_many([card_data])
+
+    def _where(self, filters: Dict[str, object], search: Optional[str]):
+        clauses = []
+        params = []
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if name not in FILTER_COLUMNS:
+                raise ValueError(f"Unknown filter: {name}")
+            clauses.append(f"{FILTER_COLUMNS[name]} = ?")
+            params.append(value)
+        if search:
+            clauses.append("subject LIKE ?")
+            params.append(f"%{search}%")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, filters: Dict[str, object], search: Optional[str] = None, offset: int = 0, limit: int = 100) -> dict:
+        where, params = self._where(filters, search)
+        with self.lock:
+            total = self.db.execute(f"SELECT COUNT(*) FROM certs{where}", params).fetchone()[0]
+            rows = self.db.execute(
+                f"SELECT card_data FROM certs{where} ORDER BY cert_number LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        return {"total": total, "records": [json.loads(row["card_data"]) for row in rows]}
+
+    def population(self, group_by: List[str], filters: Dict[str, object], search: Optional[str] = None) -> List[dict]:
+        """Cert counts grouped by the given columns, e.g. grade population by set"""
+        unknown = [name for name in group_by if name not in GROUP_COLUMNS]
+        if unknown or not group_by:
+            raise ValueError(f"group_by must be one or more of: {', '.join(GROUP_COLUMNS)}")
+        columns = [FILTER_COLUMNS[name] for name in group_by]
+        select = ", ".join(f'{column} AS "{name}"' for column, name in zip(columns, group_by))
+        where, params = self._where(filters, search)
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {select}, COUNT(*) AS count FROM certs{where} "
+                f"GROUP BY {', '.join(columns)} ORDER BY {', '.join(columns)}",
+                params,
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM certs").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
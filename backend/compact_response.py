@@ -0,0 +1,115 @@
+import gzip
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Optional encoders; without them compact responses fall back to gzip and JSON
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+LISTING_MODES = ("full", "title", "none")
+
+# card_data fields returned by default in compact mode. `card_name` is `player` with
+# the variant text removed and `variants` repeats insert_type/parallel_type/variety,
+# so both are left out unless asked for.
+DEFAULT_FIELDS = (
+    "cert_number", "year", "brand", "set", "card_number", "player", "grade", "grade_suffix",
+    "qualifier", "variety", "insert_type", "parallel_type", "sport", "language",
+)
+
+# Responses smaller than this aren't worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+
+def trim_card_data(card_data: dict, fields: Iterable[str]) -> dict:
+    """Only the selected fields, leaving out empty ones"""
+    return {field: card_data[field] for field in fields if card_data.get(field) not in (None, "", [])}
+
+
+def compact_batch(outcomes: List[dict], fields: Optional[List[str]], listing: str, boilerplates: List[str]) -> dict:
+    """Batch results with trimmed card data and shared listing boilerplate sent once.
+
+    A listing description ending in one of `boilerplates` keeps only its unique part,
+    with `boilerplate` naming the shared text to append (after a newline) from the
+    top-level `boilerplate` map.
+    """
+    if listing not in LISTING_MODES:
+        raise ValueError(f"listing must be one of: {', '.join(LISTING_MODES)}")
+    fields = tuple(fields) if fields else DEFAULT_FIELDS
+    suffixes = {text: str(index) for index, text in enumerate(boilerplates) if text}
+    used = {}
+    results = []
+    errors = []
+    for outcome in outcomes:
+        if not outcome.get("success"):
+            errors.append(outcome)
+            continue
+        result = {"cert_number": outcome["cert_number"], "card_data": trim_card_data(outcome["card_data"], fields)}
+        if listing != "none" and outcome.get("listing"):
+            compact_listing = {"title": outcome["listing"]["title"]}
+            if listing == "full":
+                description = outcome["listing"]["description"]
+                for text, key in suffixes.items():
+                    if description.endswith("\n" + text):
+                        compact_listing["boilerplate"] = key
+                        description = description[:-len(text) - 1]
+                        used[key] = text
+                        break
+                compact_listing["description"] = description
+            result["listing"] = compact_listing
+        results.append(result)
+
+    return {
+        "success": True,
+        "format": "compact",
+        "total_processed": len(outcomes),
+        "successful": len(results),
+        "failed": len(errors),
+        "boilerplate": used,
+        "results": results,
+        "errors": errors,
+    }
+
+
+def _accepts(header: Optional[str], value: str) -> bool:
+    """Whether an Accept or Accept-Encoding header explicitly lists `value` with a non-zero q"""
+    for item in (header or "").lower().split(","):
+        name, *params = (part.strip() for part in item.split(";"))
+        if name != value:
+            continue
+        for param in params:
+            key, _, weight = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    return float(weight) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def encode(payload: dict, accept: Optional[str], accept_encoding: Optional[str]) -> Tuple[bytes, str, Dict[str, str]]:
+    """(body, media type, headers): MessagePack when accepted and available, JSON otherwise, then brotli or gzip"""
+    media_type = next((media for media in MSGPACK_MEDIA_TYPES if _accepts(accept, media)), None)
+    if media_type and msgpack is not None:
+        body = msgpack.packb(payload, use_bin_type=True)
+    else:
+        media_type = "application/json"
+        body = json.dumps(payload, separators=(",", ":")).encode()
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if len(body) >= MIN_COMPRESS_BYTES:
+        if brotli is not None and _accepts(accept_encoding, "br"):
+            body = brotli.compress(body, quality=5)
+            headers["Content-Encoding"] = "br"
+        elif _accepts(accept_encoding, "gzip"):
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+    return body, media_type, headers
@@ -0,0 +1,287 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+CROCKFORD_BASE32 = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+
+def new_tracking_number() -> str:
+    """ULID-style ID: 48-bit millisecond timestamp plus 80 random bits, so IDs sort by time and never collide in practice"""
+    value = (int(time.time() * 1000) << 80) | int.from_bytes(secrets.token_bytes(10), "big")
+    chars = []
+    for _ in range(26):
+        value, index = divmod(value, 32)
+        chars.append(CROCKFORD_BASE32[index])
+    return "CON-" + "".join(reversed(chars))
+
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+class ConsignmentStore:
+    """SQLite record of consignment submissions, written behind in batches.
+
+    Submissions are acknowledged as soon as they are queued and flushed to disk in
+    one transaction per batch; lookups also see queued submissions. Card records are
+    stored once per distinct content, as immutable snapshots keyed by their hash, so
+    a consignment always shows the data as it was submitted. Submissions that still
+    can't be written at shutdown are spilled to a file and queued again on startup.
+    """
+
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 0.5):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.spill_path = path + ".spill.ndjson"
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.pending = {}
+        self.queue = None
+        self.task = None
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS consignments (
+                tracking_number TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                email TEXT NOT NULL,
+                notes TEXT,
+                cert_range TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                successful INTEGER NOT NULL,
+                failed INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS consignment_cards (
+                tracking_number TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                cert_number TEXT NOT NULL,
+                card_hash TEXT,
+                error TEXT,
+                PRIMARY KEY (tracking_number, seq)
+            );
+            CREATE INDEX IF NOT EXISTS idx_consignments_email ON consignments (email, created_at);
+            CREATE TABLE IF NOT EXISTS card_snapshots (
+                hash TEXT PRIMARY KEY,
+                card_data TEXT NOT NULL
+            );
+            """
+        )
+        self.db.commit()
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self._load_spill()
+        self.task = asyncio.create_task(self._writer())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the writer"""
+        if self.task is None:
+            return
+        await self.queue.put(None)
+        await self.task
+        self.task = None
+
+    def submit(self, name: str, email: str, notes: Optional[str], cert_range: dict, results: dict) -> dict:
+        """Queue a submission for writing and return its summary, tracking number included"""
+        outcomes = list(results.get("results") or []) + list(results.get("errors") or [])
+        cards = []
+        for outcome in outcomes:
+            if not isinstance(outcome, dict) or not outcome.get("cert_number"):
+                continue
+            cards.append({
+                "cert_number": str(outcome["cert_number"]),
+                "card_data": outcome.get("card_data") if outcome.get("success") else None,
+                "error": None if outcome.get("success") else outcome.get("error"),
+            })
+        successful = sum(1 for card in cards if card["card_data"])
+        record = {
+            "tracking_number": new_tracking_number(),
+            "name": name,
+            "email": normalize_email(email),
+            "notes": notes,
+            "cert_range": cert_range,
+            "total": len(cards),
+            "successful": successful,
+            "failed": len(cards) - successful,
+            "status": "received",
+            "created_at": time.time(),
+        }
+        self.pending[record["tracking_number"]] = (record, cards)
+        self.queue.put_nowait(record["tracking_number"])
+        return dict(record)
+
+    async def _writer(self):
+        while True:
+            tracking_number = await self.queue.get()
+            batch = [] if tracking_number is None else [tracking_number]
+            stopping = tracking_number is None
+            # Gather whatever else arrives within the flush interval into the same transaction
+            deadline = time.monotonic() + self.flush_interval
+            while not stopping and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    tracking_number = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if tracking_number is None:
+                    stopping = True
+                else:
+                    batch.append(tracking_number)
+            if stopping:
+                while not self.queue.empty():
+                    tracking_number = self.queue.get_nowait()
+                    if tracking_number is not None:
+                        batch.append(tracking_number)
+
+            if batch:
+                submissions = [self.pending[number] for number in batch]
+                try:
+                    await asyncio.to_thread(self._write, submissions)
+                except Exception:
+                    logger.exception("Failed to write %d consignments", len(batch))
+                    if not stopping:
+                        # Keep them pending (still visible to lookups) and try again with the next batch
+                        for number in batch:
+                            self.queue.put_nowait(number)
+                        continue
+                    # No next batch: these already have tracking numbers, so they must not be dropped
+                    self._write_or_spill(submissions)
+                for number in batch:
+                    self.pending.pop(number, None)
+            if stopping:
+                return
+
+    def _write_or_spill(self, submissions: List[tuple]):
+        """Last attempt at shutdown: retry the write once, else append the submissions to the spill file"""
+        try:
+            self._write(submissions)
+            return
+        except Exception:
+            logger.exception("Retrying the write failed; spilling %d consignments to %s", len(submissions), self.spill_path)
+        try:
+            with open(self.spill_path, "a", encoding="utf-8") as spill:
+                for record, cards in submissions:
+                    spill.write(json.dumps({"record": record, "cards": cards}) + "\n")
+        except OSError:
+            logger.exception(
+                "Could not spill consignments; lost: %s",
+                ", ".join(record["tracking_number"] for record, _ in submissions),
+            )
+
+    def _load_spill(self):
+        """Queue submissions spilled by a previous shutdown; they are written with the next batch"""
+        if not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path, encoding="utf-8") as spill:
+            entries = [json.loads(line) for line in spill if line.strip()]
+        for entry in entries:
+            record = entry["record"]
+            self.pending[record["tracking_number"]] = (record, entry["cards"])
+            self.queue.put_nowait(record["tracking_number"])
+        os.remove(self.spill_path)
+        logger.info("Queued %d consignments spilled by the previous shutdown", len(entries))
+
+    def _write(self, submissions: List[tuple]):
+        consignment_rows = []
+        card_rows = []
+        snapshots = {}
+        for record, cards in submissions:
+            consignment_rows.append((
+                record["tracking_number"], record["name"], record["email"], record["notes"],
+                json.dumps(record["cert_range"]), record["total"], record["successful"], record["failed"],
+                record["status"], record["created_at"],
+            ))
+            for seq, card in enumerate(cards):
+                card_hash = None
+                if card["card_data"] is not None:
+                    # Canonical JSON, so the same card submitted again maps to the same snapshot
+                    payload = json.dumps(card["card_data"], sort_keys=True, separators=(",", ":"))
+                    card_hash = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+                    snapshots[card_hash] = payload
+                card_rows.append((record["tracking_number"], seq, card["cert_number"], card_hash, card["error"]))
+        with self.lock:
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO card_snapshots (hash, card_data) VALUES (?, ?)",
+                    snapshots.items(),
+                )
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO consignments (tracking_number, name, email, notes, cert_range, total, "
+                    "successful, failed, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    consignment_rows,
+                )
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO consignment_cards (tracking_number, seq, cert_number, card_hash, error) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    card_rows,
+                )
+
+    def get(self, tracking_number: str) -> Optional[dict]:
+        """A submission with its cards, card data resolved from their snapshots"""
+        pending = self.pending.get(tracking_number)
+        if pending is not None:
+            record, cards = pending
+            return {**record, "cards": [dict(card) for card in cards]}
+
+        with self.lock:
+            row = self.db.execute("SELECT * FROM consignments WHERE tracking_number = ?", (tracking_number,)).fetchone()
+            if row is None:
+                return None
+            card_rows = self.db.execute(
+                "SELECT c.cert_number, c.error, s.card_data AS snapshot "
+                "FROM consignment_cards c LEFT JOIN card_snapshots s ON s.hash = c.card_hash "
+                "WHERE c.tracking_number = ? ORDER BY c.seq",
+                (tracking_number,),
+            ).fetchall()
+        cards = [
+            {
+                "cert_number": card["cert_number"],
+                "card_data": json.loads(card["snapshot"]) if card["snapshot"] else None,
+                "error": card["error"],
+            }
+            for card in card_rows
+        ]
+        return {**self._record(row), "cards": cards}
+
+    def find_by_email(self, email: str, offset: int = 0, limit: int = 50) -> List[dict]:
+        """Submission summaries for an email address, newest first"""
+        email = normalize_email(email)
+        queued = sorted(
+            (dict(record) for record, _ in list(self.pending.values()) if record["email"] == email),
+            key=lambda record: record["created_at"],
+            reverse=True,
+        )
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT * FROM consignments WHERE email = ? ORDER BY created_at DESC LIMIT ?",
+                (email, offset + limit),
+            ).fetchall()
+        stored = [self._record(row) for row in rows if row["tracking_number"] not in self.pending]
+        return (queued + stored)[offset:offset + limit]
+
+    def _record(self, row: sqlite3.Row) -> dict:
+        record = dict(row)
+        record["cert_range"] = json.loads(record["cert_range"])
+        return record
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,341 @@
+import asyncio
+import itertools
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Optional, Union
+
+import httpx
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying; of these, THROTTLE_STATUSES also mean we are sending too fast
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+
+class UpstreamError(Exception):
+    """An upstream request kept failing with throttling or transient errors after all retries"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header given as seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token-bucket rate limiter shared by every request made through an engine"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        # Waiters queue on the lock so tokens are handed out in arrival order
+        async with self.lock:
+            while True:
+                paused = self.paused_until - time.monotonic()
+                if paused > 0:
+                    await asyncio.sleep(paused)
+                    continue
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def acquire_idle(self, reserve: float = 1.0):
+        """Low-priority acquire: only take a token no regular request is waiting for, leaving `reserve` spare"""
+        reserve = min(reserve, self.capacity - 1)
+        while True:
+            if not self.lock.locked() and time.monotonic() >= self.paused_until:
+                self._refill()
+                if self.tokens >= 1 + reserve:
+                    self.tokens -= 1
+                    return
+            await asyncio.sleep(1 / self.rate)
+
+    def adjust_rate(self, factor: float, step: float, min_rate: float, max_rate: float):
+        """Set the rate to `rate * factor + step / rate`, kept within [min_rate, max_rate]"""
+        rate = self.rate * factor
+        self.rate = min(max_rate, max(min_rate, rate + step / rate))
+
+    def pause(self, seconds: float):
+        """Hold back every request until `seconds` from now, e.g. to honor Retry-After"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        # Don't let tokens accumulate over the pause and release a burst afterwards
+        self.tokens = min(self.tokens, 1.0)
+
+
+class AdaptiveRate:
+    """Additive-increase/multiplicative-decrease control of a token bucket's rate.
+
+    Each success raises the rate by roughly `increase` requests/second per second of
+    traffic; a throttling response cuts it by `decrease`, at most once per `cooldown`
+    so a burst of throttled in-flight requests only counts once.
+    """
+
+    def __init__(self, limiter: TokenBucket, min_rate: float, max_rate: float,
+                 increase: float = 0.5, decrease: float = 0.5, cooldown: float = 1.0):
+        self.limiter = limiter
+        self.min_rate = min_rate
+        self.max_rate = max(min_rate, max_rate)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.last_decrease = 0.0
+
+    def on_success(self):
+        self.limiter.adjust_rate(1.0, self.increase, self.min_rate, self.max_rate)
+
+    def on_throttle(self):
+        now = time.monotonic()
+        if now - self.last_decrease < self.cooldown:
+            return
+        self.last_decrease = now
+        self.limiter.adjust_rate(self.decrease, 0.0, self.min_rate, self.max_rate)
+        logger.info("Upstream throttled; request rate reduced to %.2f/s", self.limiter.rate)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one shared in-flight call.
+
+    A background call is started as `func(promote)`; `promote` is an asyncio.Event set
+    as soon as a regular caller joins, so the call can stop waiting for spare capacity.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.promotions = {}
+
+    async def do(self, key, func: Callable[..., Awaitable], background: bool = False):
+        future = self.calls.get(key)
+        if future is None:
+            if background:
+                promote = self.promotions[key] = asyncio.Event()
+                future = asyncio.ensure_future(func(promote))
+            else:
+                future = asyncio.ensure_future(func())
+            self.calls[key] = future
+            future.add_done_callback(lambda _: self._done(key))
+        elif not background and key in self.promotions:
+            self.promotions[key].set()
+        # Shielded so one waiter going away does not cancel the call for the others
+        return await asyncio.shield(future)
+
+    def _done(self, key):
+        self.calls.pop(key, None)
+        self.promotions.pop(key, None)
+
+
+class FetchEngine:
+    """Pooled async HTTP client with bounded parallelism, optional rate limiting and retries.
+
+    Throttling (429/503), other 5xx responses and network errors are retried with
+    jittered exponential backoff, honoring Retry-After. With `adaptive` set, the rate
+    limiter follows an AIMD controller instead of staying at the configured rate.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 5,
+        rate: Optional[float] = None,
+        burst: int = 1,
+        timeout: float = 30.0,
+        name: str = "upstream",
+        max_retries: int = 0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        adaptive: bool = False,
+        min_rate: Optional[float] = None,
+        max_rate: Optional[float] = None,
+        limiter=None,
+    ):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        # A limiter passed in (e.g. one shared between worker processes) replaces the local bucket
+        if limiter is None and rate and rate > 0:
+            limiter = TokenBucket(rate, burst)
+        self.limiter = limiter
+        self.controller = None
+        if adaptive and self.limiter:
+            self.controller = AdaptiveRate(
+                self.limiter,
+                min_rate=min_rate or self.limiter.rate / 10,
+                max_rate=max_rate or self.limiter.rate * 4,
+            )
+        if self.limiter:
+            metrics.upstream_rate_limit.set(self.limiter.rate, upstream=name)
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so the client binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+        return self._client
+
+    def backoff(self, attempt: int) -> float:
+        # "Full jitter": spreads retries out so throttled clients don't retry in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _acquire_idle(self, promote: Optional[asyncio.Event]) -> bool:
+        """Wait for spare rate budget; False if `promote` was set first and no token was taken"""
+        if promote is None:
+            await self.limiter.acquire_idle()
+            return True
+        idle = asyncio.ensure_future(self.limiter.acquire_idle())
+        promoted = asyncio.ensure_future(promote.wait())
+        try:
+            await asyncio.wait((idle, promoted), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            promoted.cancel()
+            if not idle.done():
+                idle.cancel()
+            await asyncio.gather(idle, promoted, return_exceptions=True)
+        if idle.cancelled():
+            return False
+        idle.result()
+        return True
+
+    async def request(
+        self, method: str, url: str, background: bool = False, promote: Optional[asyncio.Event] = None, **kwargs
+    ) -> httpx.Response:
+        """Send a request, retrying transient failures; raises UpstreamError once retries run out.
+
+        Background requests only use rate budget that regular requests leave unused,
+        until `promote` is set (e.g. a user is now waiting for the result).
+        """
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                # Wait for spare budget before taking a connection slot from regular requests
+                if background and self.limiter and not await self._acquire_idle(promote):
+                    # Promoted while waiting: take a token like a regular request
+                    background = False
+                async with self.semaphore:
+                    if self.limiter and not background:
+                        await self.limiter.acquire()
+                    response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                failure = f"{e.__class__.__name__}: {str(e) or 'request failed'}"
+                status_code = None
+                reason = "network"
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    if self.controller:
+                        self.controller.on_success()
+                        metrics.upstream_rate_limit.set(self.limiter.rate, upstream=self.name)
+                    return response
+                failure = f"HTTP {response.status_code}"
+                status_code = response.status_code
+                reason = str(response.status_code)
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if status_code in THROTTLE_STATUSES:
+                    if self.controller:
+                        self.controller.on_throttle()
+                        metrics.upstream_rate_limit.set(self.limiter.rate, upstream=self.name)
+                    if retry_after and self.limiter:
+                        self.limiter.pause(retry_after)
+
+            if attempt == self.max_retries:
+                break
+            delay = retry_after if retry_after is not None else self.backoff(attempt)
+            metrics.upstream_retries.inc(upstream=self.name, reason=reason)
+            logger.debug("%s %s failed with %s; retrying in %.2fs", method, url, failure, delay)
+            await asyncio.sleep(min(delay, self.backoff_max))
+
+        metrics.upstream_failures.inc(upstream=self.name)
+        raise UpstreamError(
+            f"{self.name} request failed after {self.max_retries + 1} attempts ({failure})",
+            status_code=status_code,
+        )
+
+    async def get(self, url: str, background: bool = False, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, background=background, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def imap_unordered(
+        self,
+        func: Callable[..., Awaitable],
+        items: Union[Iterable, AsyncIterable],
+        limit: Optional[int] = None,
+    ) -> AsyncIterator:
+        """Run func over items, yielding each result as soon as it completes.
+
+        At most `limit` (default: the engine's max concurrency) calls are in flight,
+        and items are pulled only as slots free up, so memory stays bounded no matter
+        how many items are supplied. Items may be a regular or an async iterable.
+        """
+        limit = max(1, limit or self.max_concurrency)
+        if hasattr(items, "__aiter__"):
+            source = items.__aiter__()
+
+            async def take(count):
+                taken = []
+                while len(taken) < count:
+                    try:
+                        taken.append(await source.__anext__())
+                    except StopAsyncIteration:
+                        break
+                return taken
+        else:
+            source = iter(items)
+
+            async def take(count):
+                return list(itertools.islice(source, count))
+
+        pending = {asyncio.ensure_future(func(item)) for item in await take(limit)}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for item in await take(len(done)):
+                    pending.add(asyncio.ensure_future(func(item)))
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
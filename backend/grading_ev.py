@@ -0,0 +1,178 @@
+import itertools
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Calculator inputs, named as in the frontend's calculateGradingScenario
+INPUT_FIELDS = (
+    "rawPrice", "gradingFee", "ebayShipping",
+    "psa10Price", "psa9Price", "psa8Price",
+    "psa10Rate", "psa9Rate", "psa8Rate",
+    "ebayFee", "resellerPercent", "resellerShipping",
+    "consignerHighPercent", "consignerLowExtra", "consignerFlatFee",
+)
+RATE_FIELDS = ("psa10Rate", "psa9Rate", "psa8Rate")
+SELLING_METHODS = ("ebay", "reseller", "consigner")
+
+# Cap on cards x scenarios evaluated at once during a sweep, to bound memory
+SWEEP_CHUNK_ELEMENTS = 4_000_000
+
+
+def _number(value) -> float:
+    """Coerce like the frontend's `Number(x) || 0`"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if math.isnan(number) else number
+
+
+def to_arrays(cards: List[dict], defaults: Optional[dict] = None) -> Dict[str, np.ndarray]:
+    """Column arrays of calculator inputs; fields missing from a card fall back to defaults, then 0"""
+    defaults = defaults or {}
+    count = len(cards)
+    return {
+        field: np.fromiter(
+            (_number(card.get(field, defaults.get(field))) for card in cards),
+            dtype=np.float64,
+            count=count,
+        )
+        for field in INPUT_FIELDS
+    }
+
+
+def selling_methods(total_ev: np.ndarray, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+    """Net proceeds per selling method, shaped (..., 3) in SELLING_METHODS order"""
+    ebay = total_ev - (total_ev * inputs["ebayFee"] / 100) - inputs["ebayShipping"]
+    reseller = (total_ev * inputs["resellerPercent"] / 100) - inputs["resellerShipping"]
+    consigner = (total_ev * inputs["consignerHighPercent"] / 100) - inputs["consignerFlatFee"]
+    consigner = np.where(total_ev >= 100, consigner, consigner - inputs["consignerLowExtra"])
+    return np.stack(np.broadcast_arrays(ebay, reseller, consigner), axis=-1)
+
+
+def best_method_index(nets: np.ndarray) -> np.ndarray:
+    # The calculator keeps the later method on ties, so search from the end
+    return nets.shape[-1] - 1 - np.argmax(nets[..., ::-1], axis=-1)
+
+
+def evaluate(inputs: Dict[str, np.ndarray], rates: Optional[Dict[str, np.ndarray]] = None) -> dict:
+    """Expected value, costs, per-method nets and best method for every card at once"""
+    rates = rates or inputs
+    total_ev = (
+        inputs["psa10Price"] * rates["psa10Rate"]
+        + inputs["psa9Price"] * rates["psa9Rate"]
+        + inputs["psa8Price"] * rates["psa8Rate"]
+    ) / 100
+    total_costs = inputs["rawPrice"] + inputs["gradingFee"] + inputs["ebayShipping"]
+    nets = selling_methods(total_ev, inputs)
+    best = best_method_index(nets)
+    best_net = np.take_along_axis(nets, best[..., None], axis=-1)[..., 0]
+    return {
+        "total_ev": total_ev,
+        "total_costs": total_costs,
+        "nets": nets,
+        "best": best,
+        "best_net": best_net,
+        "profit": best_net - total_costs,
+    }
+
+
+def summarize(evaluation: dict) -> dict:
+    best_counts = np.bincount(evaluation["best"].ravel(), minlength=len(SELLING_METHODS))
+    profit = evaluation["profit"]
+    return {
+        "cards": int(profit.size),
+        "total_ev": float(evaluation["total_ev"].sum()),
+        "total_costs": float(evaluation["total_costs"].sum()),
+        "total_best_net": float(evaluation["best_net"].sum()),
+        "total_profit": float(profit.sum()),
+        "profitable_count": int((profit > 0).sum()),
+        "best_method_counts": {method: int(n) for method, n in zip(SELLING_METHODS, best_counts)},
+    }
+
+
+def card_results(evaluation: dict) -> List[dict]:
+    total_ev = evaluation["total_ev"].tolist()
+    total_costs = evaluation["total_costs"].tolist()
+    nets = evaluation["nets"].tolist()
+    best = evaluation["best"].tolist()
+    profit = evaluation["profit"].tolist()
+    results = []
+    for index in range(len(total_ev)):
+        method_nets = dict(zip(SELLING_METHODS, nets[index]))
+        best_method = SELLING_METHODS[best[index]]
+        results.append({
+            "totalEV": total_ev[index],
+            "totalCosts": total_costs[index],
+            "sellingMethods": method_nets,
+            "bestMethod": best_method,
+            "netEV": method_nets[best_method],
+            "profit": profit[index],
+            "shouldGrade": profit[index] > 0,
+        })
+    return results
+
+
+def shifted_rates(inputs: Dict[str, np.ndarray], deltas: np.ndarray, fields: List[str]) -> Dict[str, np.ndarray]:
+    """Grade rates for each scenario (rows) and card (columns), shifted by percentage-point deltas.
+
+    Each rate is clamped to 0-100, and if the three rates then exceed 100% they
+    are scaled down proportionally.
+    """
+    rates = {}
+    for field in RATE_FIELDS:
+        rate = np.broadcast_to(inputs[field], (deltas.shape[0], inputs[field].shape[0]))
+        if field in fields:
+            rate = rate + deltas[:, fields.index(field)][:, None]
+        rates[field] = np.clip(rate, 0, 100)
+    total = rates["psa10Rate"] + rates["psa9Rate"] + rates["psa8Rate"]
+    scale = np.where(total > 100, 100 / np.maximum(total, 1e-12), 1.0)
+    return {field: rate * scale for field, rate in rates.items()}
+
+
+def sensitivity_sweep(inputs: Dict[str, np.ndarray], sweep: Dict[str, List[float]]) -> List[dict]:
+    """Collection totals for every combination of grade-rate shifts in `sweep`"""
+    fields = [field for field in RATE_FIELDS if field in sweep]
+    unknown = set(sweep) - set(RATE_FIELDS)
+    if unknown:
+        raise ValueError(f"Can only sweep grade rates, not: {', '.join(sorted(unknown))}")
+    scenarios = np.array(list(itertools.product(*(sweep[field] for field in fields))), dtype=np.float64)
+    if scenarios.size == 0:
+        return []
+
+    cards = max(1, inputs["rawPrice"].shape[0])
+    chunk = max(1, SWEEP_CHUNK_ELEMENTS // cards)
+    results = []
+    for start in range(0, scenarios.shape[0], chunk):
+        deltas = scenarios[start:start + chunk]
+        evaluation = evaluate(inputs, shifted_rates(inputs, deltas, fields))
+        profit = evaluation["profit"]
+        total_best_net = evaluation["best_net"].sum(axis=1)
+        total_profit = profit.sum(axis=1)
+        profitable = (profit > 0).sum(axis=1)
+        for row, delta in enumerate(deltas):
+            results.append({
+                "shifts": dict(zip(fields, delta.tolist())),
+                "total_best_net": float(total_best_net[row]),
+                "total_profit": float(total_profit[row]),
+                "profitable_count": int(profitable[row]),
+            })
+    return results
+
+
+def evaluate_collection(
+    cards: List[dict],
+    defaults: Optional[dict] = None,
+    sweep: Optional[Dict[str, List[float]]] = None,
+    include_cards: bool = True,
+) -> dict:
+    """Grading EV for a whole collection, with optional per-card results and rate sensitivity sweep"""
+    inputs = to_arrays(cards, defaults)
+    evaluation = evaluate(inputs)
+    result = {"summary": summarize(evaluation)}
+    if include_cards:
+        result["cards"] = card_results(evaluation)
+    if sweep:
+        result["sensitivity"] = sensitivity_sweep(inputs, sweep)
+    return result
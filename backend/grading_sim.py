@@ -0,0 +1,134 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import grading_ev
+
+# Cap on simulations x cards sampled at once inside a worker, to bound memory
+SAMPLE_CHUNK_ELEMENTS = 2_000_000
+PERCENTILES = (1, 5, 10, 25, 50, 75, 90, 95, 99)
+HISTOGRAM_BINS = 50
+
+_executor = None
+_executor_workers = None
+
+
+def get_executor(workers: int) -> ProcessPoolExecutor:
+    """Process pool shared across simulations, recreated only if the worker count changes"""
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers != workers:
+        shutdown_executor()
+        # Forking the server would copy its event loop, threads and open sockets into each worker
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+        _executor_workers = workers
+    return _executor
+
+
+def shutdown_executor():
+    global _executor, _executor_workers
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+        _executor_workers = None
+
+
+def outcome_profits(inputs: Dict[str, np.ndarray], methods: np.ndarray) -> np.ndarray:
+    """Profit of each card for each grade outcome (PSA 10, 9, 8, below 8), shaped (4, cards)"""
+    values = np.stack([inputs["psa10Price"], inputs["psa9Price"], inputs["psa8Price"], np.zeros_like(inputs["psa8Price"])])
+    nets = grading_ev.selling_methods(values, inputs)
+    realized = np.take_along_axis(nets, np.broadcast_to(methods, values.shape)[..., None], axis=-1)[..., 0]
+    total_costs = inputs["rawPrice"] + inputs["gradingFee"] + inputs["ebayShipping"]
+    return realized - total_costs
+
+
+def _simulate_chunk(inputs: Dict[str, np.ndarray], methods: np.ndarray, simulations: int, seed) -> np.ndarray:
+    """Total submission profit for each of `simulations` sampled grading outcomes"""
+    rng = np.random.default_rng(seed)
+    cards = methods.shape[0]
+    # Cumulative grade thresholds; a draw past all three grades below PSA 8
+    t10 = np.clip(inputs["psa10Rate"], 0, 100) / 100
+    t9 = np.minimum(t10 + np.clip(inputs["psa9Rate"], 0, 100) / 100, 1.0)
+    t8 = np.minimum(t9 + np.clip(inputs["psa8Rate"], 0, 100) / 100, 1.0)
+    # Outcome k of card i lives at k * cards + i
+    flat_profits = outcome_profits(inputs, methods).ravel()
+    card_offsets = np.arange(cards)
+
+    profits = np.empty(simulations, dtype=np.float64)
+    rows = max(1, SAMPLE_CHUNK_ELEMENTS // max(1, cards))
+    for start in range(0, simulations, rows):
+        count = min(rows, simulations - start)
+        draws = rng.random((count, cards))
+        outcome = (draws >= t10).astype(np.intp)
+        outcome += draws >= t9
+        outcome += draws >= t8
+        profits[start:start + count] = flat_profits[outcome * cards + card_offsets].sum(axis=1)
+    return profits
+
+
+def simulate_profits(
+    inputs: Dict[str, np.ndarray],
+    methods: np.ndarray,
+    simulations: int,
+    workers: int = 1,
+    seed: Optional[int] = None,
+) -> np.ndarray:
+    """Sample submission profits, splitting the simulations across a process pool"""
+    workers = max(1, min(workers, simulations))
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    counts = [simulations // workers + (1 if index < simulations % workers else 0) for index in range(workers)]
+    if workers == 1:
+        return _simulate_chunk(inputs, methods, counts[0], seeds[0])
+    executor = get_executor(workers)
+    chunks = executor.map(_simulate_chunk, [inputs] * workers, [methods] * workers, counts, seeds)
+    return np.concatenate(list(chunks))
+
+
+def summarize_profits(profits: np.ndarray) -> dict:
+    counts, edges = np.histogram(profits, bins=HISTOGRAM_BINS)
+    return {
+        "simulations": int(profits.size),
+        "mean": float(profits.mean()),
+        "std": float(profits.std()),
+        "min": float(profits.min()),
+        "max": float(profits.max()),
+        "loss_probability": float((profits < 0).mean()),
+        "percentiles": {
+            f"p{p}": float(value) for p, value in zip(PERCENTILES, np.percentile(profits, PERCENTILES))
+        },
+        "histogram": {"counts": counts.tolist(), "edges": edges.tolist()},
+    }
+
+
+def simulate_submission(
+    cards: List[dict],
+    defaults: Optional[dict] = None,
+    simulations: int = 100000,
+    method: Optional[str] = None,
+    workers: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> dict:
+    """Profit distribution of grading a submission, selling each card by `method` or its best EV method"""
+    if method is not None and method not in grading_ev.SELLING_METHODS:
+        raise ValueError(f"Unknown selling method: {method}")
+    if not cards:
+        raise ValueError("No cards provided")
+    if simulations < 1:
+        raise ValueError("At least one simulation is required")
+
+    inputs = grading_ev.to_arrays(cards, defaults)
+    evaluation = grading_ev.evaluate(inputs)
+    if method is None:
+        methods = evaluation["best"]
+    else:
+        methods = np.full(len(cards), grading_ev.SELLING_METHODS.index(method))
+    expected_nets = np.take_along_axis(evaluation["nets"], methods[:, None], axis=-1)[:, 0]
+
+    profits = simulate_profits(inputs, methods, simulations, workers or os.cpu_count() or 1, seed)
+    return {
+        "expected_profit": float((expected_nets - evaluation["total_costs"]).sum()),
+        "distribution": summarize_profits(profits),
+    }
@@ -0,0 +1,128 @@
+import base64
+import binascii
+import functools
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+
+@functools.lru_cache(maxsize=None)
+def _pil_image():
+    """PIL.Image, imported on first use; None without Pillow (only exact byte matches are cached then)"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def decode_image(image_data: str) -> bytes:
+    """Return the raw bytes of a base64 image, or the URL itself for linked images"""
+    if image_data.startswith('http'):
+        return image_data.encode()
+    if image_data.startswith('data:') and ',' in image_data:
+        image_data = image_data.split(',', 1)[1]
+    try:
+        return base64.b64decode(image_data, validate=False)
+    except (binascii.Error, ValueError):
+        return image_data.encode()
+
+
+def perceptual_hash(image_bytes: bytes) -> Optional[int]:
+    """64-bit difference hash (dHash) of an image, or None if it cannot be decoded"""
+    Image = _pil_image()
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            pixels = list(image.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    except Exception:
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def fingerprint(image_data: str, perceptual: bool = True) -> Tuple[str, Optional[int]]:
+    """Exact SHA-256 digest of the decoded image, plus its perceptual hash if asked for"""
+    image_bytes = decode_image(image_data)
+    return hashlib.sha256(image_bytes).hexdigest(), perceptual_hash(image_bytes) if perceptual else None
+
+
+class ImageExtractionCache:
+    """Bounded LRU of cert numbers extracted from images.
+
+    Entries are found by exact digest. Photos of different slabs in the same holder
+    and setting can share a perceptual hash, so near matches are off by default
+    (max_distance < 0); when enabled, `similar` only offers a candidate, which the
+    caller must confirm before using. The namespace separates results produced by
+    different prompts.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_distance: int = -1):
+        self.max_entries = max(1, max_entries)
+        self.max_distance = max_distance
+        self.near_matches = max_distance >= 0 and _pil_image() is not None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {
+            "exact_hits": 0,
+            "perceptual_hits": 0,
+            "perceptual_rejected": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+
+    def get(self, namespace: str, digest: str) -> Optional[List[str]]:
+        """Cert numbers cached for exactly this image"""
+        with self.lock:
+            key = (namespace, digest)
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            self.counters["exact_hits"] += 1
+            return list(entry[1])
+
+    def similar(self, namespace: str, phash: Optional[int]) -> Optional[List[str]]:
+        """Unconfirmed cert numbers of the closest image within max_distance bits, if near matches are on"""
+        if not self.near_matches or phash is None:
+            return None
+        with self.lock:
+            best = None
+            best_distance = self.max_distance + 1
+            for candidate_key, (candidate_phash, cert_numbers) in self.entries.items():
+                if candidate_key[0] != namespace or candidate_phash is None:
+                    continue
+                distance = (candidate_phash ^ phash).bit_count()
+                if distance < best_distance:
+                    best = cert_numbers
+                    best_distance = distance
+            return list(best) if best is not None else None
+
+    def record(self, counter: str):
+        """Count a lookup without an exact match: perceptual_hits, misses, and perceptual_rejected among misses"""
+        with self.lock:
+            self.counters[counter] += 1
+
+    def set(self, namespace: str, digest: str, phash: Optional[int], cert_numbers: List[str]):
+        with self.lock:
+            key = (namespace, digest)
+            self.entries[key] = (phash, list(cert_numbers))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.counters)
+            stats["entries"] = len(self.entries)
+        stats["near_matches"] = self.near_matches
+        return stats
@@ -0,0 +1,366 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class JobStore:
+    """SQLite-backed job records with a per-cert checkpoint of completed lookups.
+
+    The database doubles as the job queue: workers, possibly in several processes,
+    claim queued jobs with a lease they keep renewing, and a job whose lease runs
+    out (its worker died) can be claimed by anyone else.
+
+    Certs whose lookup failed for a transient reason (PSA throttling or outage) are
+    set aside as retryable rather than done; the job then ends `incomplete` and
+    resuming it looks them up again.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=10.0, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                cert_input TEXT NOT NULL,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                completed INTEGER NOT NULL DEFAULT 0,
+                successful INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                retryable INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                lease_until REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_certs (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                cert_number TEXT NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                success INTEGER,
+                retryable INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                PRIMARY KEY (job_id, seq)
+            );
+            CREATE INDEX IF NOT EXISTS idx_job_certs_pending ON job_certs (job_id, done, seq);
+            CREATE INDEX IF NOT EXISTS idx_job_certs_todo ON job_certs (job_id, done, retryable, seq);
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+            """
+        )
+        self.db.commit()
+
+    def create(self, cert_input: str, cert_numbers: List[str]) -> dict:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO jobs (id, cert_input, status, total, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, cert_input, len(cert_numbers), now, now),
+            )
+            self.db.executemany(
+                "INSERT INTO job_certs (job_id, seq, cert_number) VALUES (?, ?, ?)",
+                ((job_id, seq, cert_number) for seq, cert_number in enumerate(cert_numbers)),
+            )
+            self.db.commit()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self.lock:
+            row = self.db.execute(
+                "SELECT id, cert_input, status, total, completed, successful, failed, retryable, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def set_status(self, job_id: str, status: str):
+        with self.lock:
+            self.db.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, updated_at = ? WHERE id = ?",
+                (status, time.time(), job_id),
+            )
+            self.db.commit()
+
+    def reopen(self, job_id: str):
+        """Queue a job again, with its retryable certs pending once more"""
+        with self.lock:
+            self.db.execute(
+                "UPDATE job_certs SET retryable = 0 WHERE job_id = ? AND done = 0 AND retryable = 1",
+                (job_id,),
+            )
+            self.db.execute(
+                "UPDATE jobs SET status = 'queued', retryable = 0, owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ?",
+                (time.time(), job_id),
+            )
+            self.db.commit()
+
+    def claim(self, owner: str, lease_seconds: float) -> Optional[str]:
+        """Atomically take the oldest queued job, or a running one whose lease expired"""
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                """
+                UPDATE jobs SET status = 'running', owner = ?, lease_until = ?, updated_at = ?
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE status = 'queued' OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?))
+                    ORDER BY created_at LIMIT 1
+                )
+                RETURNING id
+                """,
+                (owner, now + lease_seconds, now, now),
+            ).fetchone()
+            self.db.commit()
+        return row["id"] if row else None
+
+    def renew(self, job_id: str, owner: str, lease_seconds: float) -> bool:
+        """Extend our lease; False if the job was cancelled, requeued or taken over meanwhile"""
+        with self.lock:
+            updated = self.db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ? AND status = 'running'",
+                (time.time() + lease_seconds, job_id, owner),
+            ).rowcount
+            self.db.commit()
+        return updated == 1
+
+    def finish(self, job_id: str, owner: str, status: str):
+        """Set a final status, unless the job was cancelled or taken over meanwhile"""
+        with self.lock:
+            self.db.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND owner = ? AND status = 'running'",
+                (status, time.time(), job_id, owner),
+            )
+            self.db.commit()
+
+    def release(self, owner: str):
+        """Requeue every job this owner is running, e.g. on shutdown, so another worker picks it up"""
+        with self.lock:
+            self.db.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE owner = ? AND status = 'running'",
+                (time.time(), owner),
+            )
+            self.db.commit()
+
+    def pending_certs(self, job_id: str, limit: int) -> List[Tuple[int, str]]:
+        """(seq, cert_number) of the next certs still to look up, retryable ones excluded"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT seq, cert_number FROM job_certs WHERE job_id = ? AND done = 0 AND retryable = 0 "
+                "ORDER BY seq LIMIT ?",
+                (job_id, limit),
+            ).fetchall()
+        return [(row["seq"], row["cert_number"]) for row in rows]
+
+    def record_results(self, job_id: str, outcomes: List[Tuple[int, dict]]):
+        """Checkpoint a batch of finished cert lookups, given as (seq, outcome), and bump the job counters"""
+        if not outcomes:
+            return
+        retries = [(json.dumps(outcome), job_id, seq) for seq, outcome in outcomes if outcome.get("retryable")]
+        rows = [
+            (1 if outcome.get("success") else 0, json.dumps(outcome), job_id, seq)
+            for seq, outcome in outcomes if not outcome.get("retryable")
+        ]
+        # Keyed on the primary key; `done = 0` skips certs already recorded, e.g. by a worker that lost its lease
+        # mid-chunk. Successes and failures go in separate statements so their summed rowcounts give the counters.
+        update = "UPDATE job_certs SET done = 1, success = ?, result = ? WHERE job_id = ? AND seq = ? AND done = 0"
+        with self.lock:
+            successful = self.db.executemany(update, [row for row in rows if row[0]]).rowcount
+            failed = self.db.executemany(update, [row for row in rows if not row[0]]).rowcount
+            completed = successful + failed
+            # Transient failures stay pending (done = 0) so resuming the job looks them up again
+            retryable = self.db.executemany(
+                "UPDATE job_certs SET retryable = 1, result = ? WHERE job_id = ? AND seq = ? AND done = 0 AND retryable = 0",
+                retries,
+            ).rowcount
+            self.db.execute(
+                "UPDATE jobs SET completed = completed + ?, successful = successful + ?, failed = failed + ?, "
+                "retryable = retryable + ?, updated_at = ? WHERE id = ?",
+                (completed, successful, failed, retryable, time.time(), job_id),
+            )
+            self.db.commit()
+
+    def results(self, job_id: str, offset: int = 0, limit: int = 100) -> List[dict]:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT result FROM job_certs WHERE job_id = ? AND done = 1 ORDER BY seq LIMIT ? OFFSET ?",
+                (job_id, limit, offset),
+            ).fetchall()
+        return [json.loads(row["result"]) for row in rows]
+
+    def iter_results(self, job_id: str, page_size: int = 500) -> Iterator[dict]:
+        """Every completed result in order, read a page at a time"""
+        last_seq = -1
+        while True:
+            with self.lock:
+                rows = self.db.execute(
+                    "SELECT seq, result FROM job_certs WHERE job_id = ? AND done = 1 AND seq > ? ORDER BY seq LIMIT ?",
+                    (job_id, last_seq, page_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield json.loads(row["result"])
+            last_seq = rows[-1]["seq"]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class JobManager:
+    """Runs cert lookup jobs in background workers, checkpointing progress to a JobStore.
+
+    Several managers (one per worker process) can share a store: each claims jobs
+    from it under a lease, so every job is processed by exactly one of them. Every
+    run of a job leases it under its own owner id, so a run that was cancelled and
+    is still winding down can't be mistaken for the run that resumed the job.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        run_lookups: Callable[[List[str]], Awaitable],
+        workers: int = 1,
+        chunk_size: int = 200,
+        checkpoint_every: int = 20,
+        lease_seconds: float = 30.0,
+        poll_interval: float = 1.0,
+    ):
+        self.store = store
+        self.run_lookups = run_lookups
+        self.workers = max(1, workers)
+        self.chunk_size = chunk_size
+        self.checkpoint_every = checkpoint_every
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.wakeup = None
+        self.tasks = []
+        self.running = {}  # owner id of each run in progress -> its job id
+        self.cancelled = set()  # owner ids of runs that should stop at the next checkpoint
+
+    async def start(self):
+        """Start workers; jobs left queued or orphaned by a previous shutdown are claimed as usual"""
+        self.wakeup = asyncio.Event()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        owners = list(self.running)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        for owner in owners:
+            self.store.release(owner)
+
+    async def submit(self, cert_input: str, cert_numbers: List[str]) -> dict:
+        # Inserting up to JOB_MAX_CERTS rows is too slow for the event loop
+        job = await asyncio.to_thread(self.store.create, cert_input, cert_numbers)
+        self.wakeup.set()
+        return job
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        job = self.store.get(job_id)
+        if job and job["status"] in ("queued", "running"):
+            # A worker in another process notices when it next renews its lease
+            self.cancelled.update(owner for owner, running_job in self.running.items() if running_job == job_id)
+            self.store.set_status(job_id, "cancelled")
+            job = self.store.get(job_id)
+        return job
+
+    def resume(self, job_id: str) -> Optional[dict]:
+        job = self.store.get(job_id)
+        if job and job["status"] in ("cancelled", "incomplete"):
+            self.store.reopen(job_id)
+            self.wakeup.set()
+            job = self.store.get(job_id)
+        return job
+
+    async def _worker(self):
+        while True:
+            owner = f"{self.worker_id}:{uuid.uuid4().hex}"
+            job_id = self.store.claim(owner, self.lease_seconds)
+            if job_id is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(job_id, owner)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # The lease runs out and the job is claimed again
+                logger.exception("Error running job %s", job_id)
+
+    async def _run(self, job_id: str, owner: str):
+        self.running[owner] = job_id
+        try:
+            job = self.store.get(job_id)
+            logger.info("Running job %s: %d certs remaining", job_id, job['total'] - job['completed'])
+            heartbeat = asyncio.create_task(self._heartbeat(job_id, owner))
+            try:
+                await self._process(job_id, owner)
+            finally:
+                heartbeat.cancel()
+        finally:
+            del self.running[owner]
+            self.cancelled.discard(owner)
+
+    async def _heartbeat(self, job_id: str, owner: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not self.store.renew(job_id, owner, self.lease_seconds):
+                # Cancelled, resumed or taken over elsewhere: stop at the next checkpoint
+                self.cancelled.add(owner)
+                return
+
+    async def _process(self, job_id: str, owner: str):
+        while owner not in self.cancelled:
+            pending_certs = self.store.pending_certs(job_id, self.chunk_size)
+            if not pending_certs:
+                retryable = self.store.get(job_id)["retryable"]
+                self.store.finish(job_id, owner, "incomplete" if retryable else "completed")
+                logger.info("Job %s finished, %d certs left to retry", job_id, retryable)
+                return
+
+            # Outcomes come back in completion order; map them back to their seq (a cert may be listed twice)
+            seqs = {}
+            for seq, cert_number in pending_certs:
+                seqs.setdefault(cert_number, []).append(seq)
+            pending = []
+            try:
+                async for outcome in self.run_lookups(list(seqs)):
+                    for seq in seqs[outcome["cert_number"]]:
+                        pending.append((seq, outcome))
+                    if len(pending) >= self.checkpoint_every:
+                        await asyncio.to_thread(self.store.record_results, job_id, pending)
+                        pending = []
+                    if owner in self.cancelled:
+                        break
+            finally:
+                await asyncio.to_thread(self.store.record_results, job_id, pending)
+
+        logger.info("Job %s stopped", job_id)
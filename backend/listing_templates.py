@@ -0,0 +1,262 @@
+import copy
+import json
+import logging
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# eBay rejects listing titles longer than this
+EBAY_MAX_TITLE_LENGTH = 80
+
+# The built-in template; seller templates override any of these keys.
+# Title order follows: [Grading] [Card Name] [Variant/Rarity] [Set Number] [Set Name] [Language] [Franchise] [Year]
+DEFAULT_TEMPLATE = {
+    "title_order": ["grading", "card_name", "variant", "set_number", "set_name", "language", "franchise", "year"],
+    # When a title is too long, components are dropped in this order before any hard cut
+    "title_drop_order": ["year", "language", "franchise", "set_number", "set_name", "variant"],
+    "max_title_length": EBAY_MAX_TITLE_LENGTH,
+    # Variants are taken from a card field, optionally only when it contains a marker
+    "variant_rules": [
+        {"field": "brand", "contains": "MASTER BALL", "variant": "MASTER BALL"},
+        {"field": "variety"},
+        {"field": "brand", "contains": "REVERSE HOLO", "variant": "REVERSE HOLO"},
+        {"field": "insert_type"},
+        {"field": "parallel_type"},
+    ],
+    # The first matching rule names the franchise; otherwise the card's sport is used
+    "franchise_rules": [
+        {"field": "brand", "contains": "POKEMON", "franchise": "Pokemon", "ignore_case": True},
+    ],
+    # eBay category: the first matching rule, else category_id (Sports Trading Card Singles)
+    "category_rules": [
+        {"field": "brand", "contains": "POKEMON", "category_id": "183454", "ignore_case": True},  # CCG Individual Cards
+    ],
+    "category_id": "261328",
+    # Fields eBay File Exchange requires on every listing. There is no sensible default price or
+    # location, so blank ones must be filled in per seller or in the exported sheet before upload.
+    "file_exchange": {
+        "start_price": "",
+        "quantity": 1,
+        "format": "FixedPrice",
+        "duration": "GTC",
+        "location": "",
+        "shipping_profile": "",
+        "return_profile": "",
+        "payment_profile": "",
+    },
+    "sections": [
+        {
+            "heading": "Shipping & Handling",
+            "lines": [
+                "FREE secure shipping with tracking (United States only)",
+                "Professional packaging with card saver and bubble mailer",
+                "Full insurance included for your protection",
+            ],
+        },
+        {
+            "heading": "Seller Notes",
+            "lines": [
+                "US-based seller with excellent feedback",
+                "Fast shipping - typically ships within 1 business day",
+                "Cards are stored in smoke-free, climate-controlled environment",
+            ],
+        },
+        {
+            "heading": "Return Policy",
+            "lines": [
+                "30-day returns accepted if item is not as described",
+                "Buyer pays return shipping",
+                "Please contact us before returning",
+            ],
+        },
+    ],
+}
+
+TITLE_COMPONENTS = ("grading", "card_name", "variant", "set_number", "set_name", "language", "franchise", "year")
+
+
+def _rule_matches(rule: dict, card_data: dict) -> bool:
+    value = card_data.get(rule["field"]) or ""
+    if "contains" not in rule:
+        return bool(value)
+    if rule.get("ignore_case"):
+        return rule["contains"].upper() in value.upper()
+    return rule["contains"] in value
+
+
+def truncate_title(components: List[List[str]], names: List[str], drop_order: List[str], max_length: int) -> str:
+    """Fit a title within max_length by dropping whole components in drop_order, then cutting at a word boundary"""
+    title = " ".join(part for parts in components for part in parts)
+    if len(title) <= max_length:
+        return title
+
+    components = [list(parts) for parts in components]
+    for name in drop_order:
+        for index, component_name in enumerate(names):
+            if component_name == name:
+                components[index] = []
+        title = " ".join(part for parts in components for part in parts)
+        if len(title) <= max_length:
+            return title
+
+    cut = title[:max_length + 1].rsplit(" ", 1)[0] if " " in title[:max_length + 1] else title[:max_length]
+    return cut[:max_length].rstrip()
+
+
+class ListingTemplate:
+    """A seller's listing template, validated and pre-rendered once so each card only fills in its own fields"""
+
+    def __init__(self, name: str, config: dict):
+        self.name = name
+        self.title_order = list(config["title_order"])
+        unknown = [component for component in self.title_order if component not in TITLE_COMPONENTS]
+        if unknown:
+            raise ValueError(f"Unknown title components in template '{name}': {', '.join(unknown)}")
+        self.title_drop_order = list(config.get("title_drop_order", []))
+        self.max_title_length = int(config.get("max_title_length", EBAY_MAX_TITLE_LENGTH))
+        self.variant_rules = [dict(rule) for rule in config.get("variant_rules", [])]
+        self.franchise_rules = [dict(rule) for rule in config.get("franchise_rules", [])]
+        self.category_rules = [dict(rule) for rule in config.get("category_rules", [])]
+        self.category_id = str(config.get("category_id", DEFAULT_TEMPLATE["category_id"]))
+        # Sellers may override only some fields, so fill the rest from the defaults
+        self.file_exchange = {**DEFAULT_TEMPLATE["file_exchange"], **config.get("file_exchange", {})}
+
+        # The boilerplate is identical for every card, so build it exactly once
+        boilerplate = []
+        for section in config.get("sections", []):
+            boilerplate.append(f"\n## {section['heading']}")
+            boilerplate.extend(f"• {line}" for line in section.get("lines", []))
+        self.boilerplate = "\n".join(boilerplate)
+
+    def variants(self, card_data: dict) -> List[str]:
+        variants = []
+        for rule in self.variant_rules:
+            if _rule_matches(rule, card_data):
+                variants.append(rule.get("variant") or card_data.get(rule["field"]))
+        return [v.strip() for v in variants if v and v.strip()]
+
+    def franchise(self, card_data: dict) -> str:
+        for rule in self.franchise_rules:
+            if _rule_matches(rule, card_data):
+                return rule["franchise"]
+        return (card_data.get('sport') or '').strip()
+
+    def category(self, card_data: dict) -> str:
+        for rule in self.category_rules:
+            if _rule_matches(rule, card_data):
+                return str(rule["category_id"])
+        return self.category_id
+
+    def grading(self, card_data: dict) -> str:
+        grade_parts = []
+        if card_data.get('grade'):
+            grade_parts.append(f"PSA {card_data['grade']}")
+        if card_data.get('qualifier'):
+            grade_parts.append(card_data['qualifier'])
+        if card_data.get('grade_suffix'):
+            grade_parts.append(card_data['grade_suffix'])
+        return ' '.join(grade_parts)
+
+    def title_components(self, card_data: dict, variants: List[str]) -> List[List[str]]:
+        language = card_data.get('language') or 'English'
+        values = {
+            'grading': self.grading(card_data),
+            'card_name': (card_data.get('card_name') or '').strip(),
+            'variant': variants,
+            'set_number': (card_data.get('card_number') or '').strip(),
+            'set_name': (card_data.get('set') or '').strip(),
+            'language': language if language != 'English' else '',
+            'franchise': self.franchise(card_data),
+            'year': (card_data.get('year') or '').strip(),
+        }
+        components = []
+        for name in self.title_order:
+            value = values[name]
+            components.append(list(value) if isinstance(value, list) else ([value] if value else []))
+        return components
+
+    def render(self, card_data: dict) -> Optional[dict]:
+        """Build the listing title and description for one card"""
+        if not card_data:
+            return None
+
+        variants = self.variants(card_data)
+        components = self.title_components(card_data, variants)
+        full_title = " ".join(part for parts in components for part in parts)
+        title = truncate_title(components, self.title_order, self.title_drop_order, self.max_title_length)
+
+        grade_info = str(card_data.get('grade', 'N/A') or '')
+        if card_data.get('qualifier'):
+            grade_info += f" ({card_data['qualifier']})"
+        if card_data.get('grade_suffix'):
+            grade_info += f" {card_data['grade_suffix']}"
+
+        description = [
+            f"# {full_title}",
+            "\n## Card Details"
+        ]
+        if card_data.get('cert_number'):
+            description.append(f"• PSA Certificate: {card_data['cert_number']}")
+        if card_data.get('grade'):
+            description.append(f"• PSA Grade: {grade_info}")
+        if card_data.get('card_name'):
+            description.append(f"• Card Name: {card_data['card_name']}")
+        if card_data.get('card_number'):
+            description.append(f"• Card Number: {card_data['card_number']}")
+        if card_data.get('year'):
+            description.append(f"• Year: {card_data['year']}")
+        if card_data.get('brand'):
+            description.append(f"• Brand: {card_data['brand']}")
+        if card_data.get('set'):
+            description.append(f"• Set: {card_data['set']}")
+        if variants:
+            description.append(f"• Variant: {', '.join(variants)}")
+        if card_data.get('language') and card_data['language'] != 'English':
+            description.append(f"• Language: {card_data['language']}")
+
+        description.extend([
+            "\n## Authentication & Grading",
+            f"• PSA Graded {grade_info}",
+            f"• Verify this card at PSA's website: https://www.psacard.com/cert/{card_data.get('cert_number', '')}",
+        ])
+        if self.boilerplate:
+            description.append(self.boilerplate)
+
+        return {
+            "title": title,
+            "description": "\n".join(description),
+            "file_exchange": {"category_id": self.category(card_data), **self.file_exchange},
+        }
+
+    def render_many(self, cards: Iterable[dict]) -> List[Optional[dict]]:
+        return [self.render(card_data) for card_data in cards]
+
+
+class TemplateRegistry:
+    """Compiled listing templates by seller, falling back to the built-in default"""
+
+    def __init__(self, configs: Optional[dict] = None):
+        self.default = ListingTemplate("default", DEFAULT_TEMPLATE)
+        self.templates = {}
+        for name, overrides in (configs or {}).items():
+            config = copy.deepcopy(DEFAULT_TEMPLATE)
+            config.update(overrides)
+            self.templates[name] = ListingTemplate(name, config)
+
+    @classmethod
+    def from_file(cls, path: Optional[str]) -> "TemplateRegistry":
+        """Load seller templates from a JSON object of {seller: overrides}"""
+        if not path:
+            return cls()
+        with open(path) as f:
+            configs = json.load(f)
+        logger.info("Loaded %d listing templates from %s", len(configs), path)
+        return cls(configs)
+
+    def get(self, seller: Optional[str] = None) -> ListingTemplate:
+        if seller is None:
+            return self.default
+        return self.templates.get(seller, self.default)
+
+    def names(self) -> List[str]:
+        return ["default"] + sorted(self.templates)
@@ -0,0 +1,95 @@
+import functools
+import importlib
+import io
+import re
+from typing import List, Tuple
+
+CERT_NUMBER_PATTERN = re.compile(r'\b\d{8,9}\b')
+
+
+@functools.lru_cache(maxsize=None)
+def _backend(name: str):
+    """Import an optional extraction backend on first use; None if it isn't installed.
+
+    All of them are optional and whichever are installed are used. They are slow to
+    import, so nothing is loaded until an image is actually processed.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+def available() -> bool:
+    """Whether any local extraction backend can run"""
+    return _backend("PIL.Image") is not None and (
+        _backend("pyzbar.pyzbar") is not None or _backend("pytesseract") is not None
+    )
+
+
+def decode_barcodes(image) -> List[str]:
+    """Cert numbers encoded in the slab label barcode"""
+    pyzbar = _backend("pyzbar.pyzbar")
+    if pyzbar is None:
+        return []
+    cert_numbers = []
+    try:
+        symbols = pyzbar.decode(image)
+    except Exception:
+        return []
+    for symbol in symbols:
+        text = symbol.data.decode('ascii', errors='ignore').strip()
+        cert_numbers.extend(CERT_NUMBER_PATTERN.findall(text))
+    return cert_numbers
+
+
+def read_digits(image) -> Tuple[List[str], float]:
+    """OCR 8-9 digit numbers from the image, returning them with the lowest word confidence (0-1)"""
+    pytesseract = _backend("pytesseract")
+    if pytesseract is None:
+        return [], 0.0
+    try:
+        data = pytesseract.image_to_data(
+            image,
+            config='--psm 11 -c tessedit_char_whitelist=0123456789',
+            output_type=pytesseract.Output.DICT,
+        )
+    except Exception:
+        return [], 0.0
+    cert_numbers = []
+    confidences = []
+    for text, confidence in zip(data['text'], data['conf']):
+        text = text.strip()
+        if CERT_NUMBER_PATTERN.fullmatch(text):
+            cert_numbers.append(text)
+            confidences.append(float(confidence) / 100)
+    return cert_numbers, min(confidences) if confidences else 0.0
+
+
+def extract_cert_numbers_locally(image_bytes: bytes, single_slab: bool = False) -> Tuple[List[str], float]:
+    """Extract cert numbers with the barcode decoder and OCR; returns (cert_numbers, confidence).
+
+    A decoded barcode is exact, but on a photo of several slabs some barcodes may not
+    decode. Barcodes alone are trusted (confidence 1.0) when the photo is known to show
+    one slab, or when OCR finds as many numbers as there are barcodes. Otherwise the
+    numbers are merged and carry the OCR confidence, so a partial read isn't mistaken
+    for the whole photo.
+    """
+    if not available():
+        return [], 0.0
+    Image, ImageOps = _backend("PIL.Image"), _backend("PIL.ImageOps")
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as opened:
+            image = ImageOps.exif_transpose(opened).convert('L')
+    except Exception:
+        return [], 0.0
+
+    barcodes = list(dict.fromkeys(decode_barcodes(image)))
+    if single_slab and len(barcodes) == 1:
+        return barcodes, 1.0
+
+    ocr_numbers, confidence = read_digits(image)
+    ocr_numbers = list(dict.fromkeys(ocr_numbers))
+    if barcodes and ocr_numbers and len(barcodes) >= len(ocr_numbers):
+        return barcodes, 1.0
+    return list(dict.fromkeys(barcodes + ocr_numbers)), confidence
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def cert_ranges(cert_input: str) -> List[Tuple[int, int]]:
+    """The `start-end` ranges in a batch cert input; single cert numbers are ignored"""
+    ranges = []
+    for part in cert_input.split(','):
+        start, sep, end = part.strip().partition('-')
+        if sep and start.strip().isdigit() and end.strip().isdigit() and int(end) >= int(start):
+            ranges.append((int(start), int(end)))
+    return ranges
+
+
+class RangePrefetcher:
+    """Speculatively warms the cert cache for the certs right after a range that was just looked up.
+
+    Users usually extend a range they just queried, so the next `span` certs are
+    fetched in the background with `fetch`, which is expected to use only spare
+    rate budget. A run stops after `max_misses` consecutive certs without data,
+    which is where the submission ends.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Optional[dict]]],
+        peek: Callable[[str], Tuple[bool, Optional[dict]]],
+        span: int = 200,
+        max_misses: int = 10,
+        max_active: int = 2,
+    ):
+        self.fetch = fetch
+        self.peek = peek
+        self.span = span
+        self.max_misses = max(1, max_misses)
+        self.max_active = max(1, max_active)
+        self.active = {}
+        self.counters = {
+            "ranges_started": 0,
+            "ranges_skipped": 0,
+            "certs_fetched": 0,
+            "certs_already_cached": 0,
+            "stopped_on_misses": 0,
+        }
+
+    def schedule(self, end: int):
+        """Prefetch the `span` certs following `end`, unless that range is already being prefetched"""
+        if self.span < 1:
+            return
+        start, stop = end + 1, end + self.span
+        overlaps = any(start <= active_stop and active_start <= stop for active_start, active_stop in self.active)
+        if overlaps or len(self.active) >= self.max_active:
+            self.counters["ranges_skipped"] += 1
+            return
+        self.counters["ranges_started"] += 1
+        task = asyncio.create_task(self._run(start, stop))
+        self.active[(start, stop)] = task
+        task.add_done_callback(lambda _: self.active.pop((start, stop), None))
+
+    async def _run(self, start: int, stop: int):
+        logger.debug("Prefetching certs %d-%d", start, stop)
+        misses = 0
+        for number in range(start, stop + 1):
+            cert_number = str(number)
+            found, card_data = self.peek(cert_number)
+            if found:
+                self.counters["certs_already_cached"] += 1
+            else:
+                try:
+                    card_data = await self.fetch(cert_number)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Upstream trouble: leave the budget to regular lookups
+                    logger.info("Stopping prefetch of certs %d-%d at #%s: %s", start, stop, cert_number, e)
+                    return
+                self.counters["certs_fetched"] += 1
+            misses = 0 if card_data else misses + 1
+            if misses >= self.max_misses:
+                self.counters["stopped_on_misses"] += 1
+                logger.debug("Prefetch stopped at #%s after %d certs without data", cert_number, misses)
+                return
+
+    async def stop(self):
+        tasks = list(self.active.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {**self.counters, "active_ranges": len(self.active)}
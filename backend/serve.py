@@ -0,0 +1,44 @@
+"""Production launcher: several uvicorn worker processes sharing one PSA request budget.
+
+Run from the backend directory:
+
+    python serve.py --workers 4
+
+Workers share the PSA rate limiter, cert cache and job queue through SQLite files in
+DATA_DIR, so adding workers adds request-handling capacity without raising the rate
+at which PSA is called. The same setup works under gunicorn with SHARED_STATE=true:
+
+    SHARED_STATE=true gunicorn -w 4 -k uvicorn.workers.UvicornWorker app:app
+"""
+import argparse
+import os
+
+from dotenv import load_dotenv
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0").strip())
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKERS", str(os.cpu_count() or 1))))
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Read by app.py in each worker process
+        os.environ["SHARED_STATE"] = "true"
+
+    import uvicorn
+
+    uvicorn.run(
+        # Each worker process imports app.py once and serves its module-level app
+        "app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=os.getenv("LOG_LEVEL", "INFO").lower(),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# A bucket row untouched for this long belongs to a previous deployment and is reset on startup
+STALE_BUCKET_SECONDS = 60
+
+
+class SharedTokenBucket:
+    """Token bucket kept in SQLite so every worker process draws from the same request budget.
+
+    Drop-in for fetch_engine.TokenBucket: `acquire`, `acquire_idle`, `pause` and `adjust_rate`,
+    whose changes apply to all workers. Rate changes and pauses are queued and written in the
+    worker thread, as relative updates so concurrent changes from other processes add up.
+    Times are wall-clock because monotonic clocks are not comparable across processes.
+    """
+
+    def __init__(self, path: str, name: str, rate: float, burst: int = 1):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.name = name
+        self.capacity = max(1, burst)
+        self._rate = rate
+        self.db_lock = threading.Lock()
+        self.lock = asyncio.Lock()
+        # Changes not yet written: combined rate factor and step, rate bounds, pause deadline
+        self.pending_lock = threading.Lock()
+        self.pending_factor = 1.0
+        self.pending_step = 0.0
+        self.rate_bounds = (0.0, float("inf"))
+        self.pending_pause_until = 0.0
+        # Autocommit mode so BEGIN IMMEDIATE below controls the transaction explicitly
+        self.db = sqlite3.connect(path, timeout=10.0, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS token_buckets ("
+            "name TEXT PRIMARY KEY, rate REAL NOT NULL, capacity REAL NOT NULL, tokens REAL NOT NULL, "
+            "updated REAL NOT NULL, paused_until REAL NOT NULL DEFAULT 0)"
+        )
+        now = time.time()
+        self.db.execute(
+            """
+            INSERT INTO token_buckets (name, rate, capacity, tokens, updated) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                rate = excluded.rate, capacity = excluded.capacity, tokens = excluded.tokens,
+                updated = excluded.updated, paused_until = 0
+            WHERE token_buckets.updated < ?
+            """,
+            (name, rate, self.capacity, float(self.capacity), now, now - STALE_BUCKET_SECONDS),
+        )
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def adjust_rate(self, factor: float, step: float, min_rate: float, max_rate: float):
+        """Queue a `rate * factor + step / rate` change (see TokenBucket); written with the next token taken"""
+        with self.pending_lock:
+            self.pending_factor *= factor
+            self.pending_step += step
+            self.rate_bounds = (min_rate, max_rate)
+        # Local estimate until the shared value is read back
+        rate = self._rate * factor
+        self._rate = min(max_rate, max(min_rate, rate + step / rate))
+
+    def _drain_pending(self) -> tuple:
+        with self.pending_lock:
+            pending = (self.pending_factor, self.pending_step, self.rate_bounds, self.pending_pause_until)
+            self.pending_factor, self.pending_step, self.pending_pause_until = 1.0, 0.0, 0.0
+        return pending
+
+    def _requeue(self, pending: tuple):
+        """Put back changes whose write was rolled back"""
+        factor, step, _, pause_until = pending
+        with self.pending_lock:
+            self.pending_factor *= factor
+            self.pending_step += step
+            self.pending_pause_until = max(self.pending_pause_until, pause_until)
+
+    def _write_pending(self, pending: tuple):
+        """Apply drained changes relative to the stored values; the caller holds db_lock inside a transaction"""
+        factor, step, (min_rate, max_rate), pause_until = pending
+        if factor != 1.0 or step:
+            self.db.execute(
+                "UPDATE token_buckets SET rate = MIN(?, MAX(?, rate * ? + ? / (rate * ?))) WHERE name = ?",
+                (max_rate, min_rate, factor, step, factor, self.name),
+            )
+        if pause_until:
+            self.db.execute(
+                "UPDATE token_buckets SET paused_until = MAX(paused_until, ?), tokens = MIN(tokens, 1.0) "
+                "WHERE name = ?",
+                (pause_until, self.name),
+            )
+
+    def _flush(self):
+        with self.db_lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            pending = self._drain_pending()
+            try:
+                self._write_pending(pending)
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                self._requeue(pending)
+                raise
+
+    def _take(self, reserve: float = 0.0) -> float:
+        """Take a token if more than `reserve` are available; otherwise return how long to wait before retrying"""
+        with self.db_lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            pending = self._drain_pending()
+            try:
+                self._write_pending(pending)
+                rate, capacity, tokens, updated, paused_until = self.db.execute(
+                    "SELECT rate, capacity, tokens, updated, paused_until FROM token_buckets WHERE name = ?",
+                    (self.name,),
+                ).fetchone()
+                self._rate = rate
+                now = time.time()
+                tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+                if paused_until > now:
+                    wait = paused_until - now
+                elif tokens >= 1 + reserve:
+                    tokens -= 1
+                    wait = 0.0
+                else:
+                    wait = (1 + reserve - tokens) / rate
+                self.db.execute(
+                    "UPDATE token_buckets SET tokens = ?, updated = ? WHERE name = ?",
+                    (tokens, now, self.name),
+                )
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                self._requeue(pending)
+                raise
+        return wait
+
+    async def acquire(self):
+        # Waiters in this process still queue on a local lock so they are served in arrival order
+        async with self.lock:
+            while True:
+                wait = await asyncio.to_thread(self._take)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+
+    async def acquire_idle(self, reserve: float = 1.0):
+        """Low-priority acquire that leaves `reserve` tokens for regular requests from any worker"""
+        reserve = min(reserve, self.capacity - 1)
+        while True:
+            if self.lock.locked():
+                await asyncio.sleep(1 / self._rate)
+                continue
+            wait = await asyncio.to_thread(self._take, reserve)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Hold back every worker's requests until `seconds` from now"""
+        with self.pending_lock:
+            self.pending_pause_until = max(self.pending_pause_until, time.time() + seconds)
+        # Other workers should see the pause now, not whenever this one next takes a token
+        task = asyncio.ensure_future(asyncio.to_thread(self._flush))
+        task.add_done_callback(self._flushed)
+
+    def _flushed(self, task: asyncio.Future):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Failed to write rate limiter pause: %s", task.exception())
+
+    def close(self):
+        with self.db_lock:
+            self.db.close()
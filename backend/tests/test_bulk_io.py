@@ -0,0 +1,70 @@
+import asyncio
+import csv
+import io
+
+import bulk_io
+from listing_templates import TemplateRegistry
+
+
+async def _chunks(data: bytes, size: int = 7):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def cert_numbers(text: str, column=None) -> list:
+    async def collect():
+        return [cert async for cert in bulk_io.iter_cert_numbers(_chunks(text.encode()), "csv", column)]
+    return asyncio.run(collect())
+
+
+def csv_rows(text: str) -> list:
+    async def collect():
+        return [row async for row in bulk_io.iter_csv_rows(bulk_io.iter_lines(_chunks(text.encode())))]
+    return asyncio.run(collect())
+
+
+def test_unquoted_cell_with_a_quote_character():
+    text = 'cert,notes\n10000001,3.5" toploader\n10000002,ok\n10000003,ok\n10000004,x'
+    assert cert_numbers(text) == ["10000001", "10000002", "10000003", "10000004"]
+
+
+def test_quoted_cell_spanning_lines():
+    text = (
+        '﻿Cert,Notes\r\n'
+        '12345678,"line one\r\n'
+        '87654321\r\n'
+        '\r\n'
+        'still notes, ""quoted"""\r\n'
+        '22222222,plain\r\n'
+    )
+    assert cert_numbers(text) == ["12345678", "22222222"]
+    assert csv_rows(text)[1] == ["12345678", 'line one\n87654321\n\nstill notes, "quoted"']
+
+
+def test_blank_lines_and_headerless_input():
+    assert cert_numbers("\n11111111\n\n22222222\n  \n33333333") == ["11111111", "22222222", "33333333"]
+
+
+def test_named_column():
+    text = "notes,PSA Cert\nfirst,11111111\nsecond,22222222\n"
+    assert cert_numbers(text, column="psa cert") == ["11111111", "22222222"]
+
+
+def test_many_rows_are_read_in_several_passes():
+    text = "cert\n" + "\n".join(str(10000000 + i) for i in range(1234))
+    assert len(cert_numbers(text)) == 1234
+
+
+def test_ebay_rows_fill_required_file_exchange_columns_from_the_seller_template():
+    templates = TemplateRegistry({"shop": {"file_exchange": {"start_price": "49.99", "location": "Austin, TX"}}})
+    card_data = {"cert_number": "12345678", "brand": "POKEMON JAPANESE", "card_name": "MEW EX", "grade": "10"}
+    outcome = {"success": True, "cert_number": "12345678", "card_data": card_data,
+               "listing": templates.get("shop").render(card_data)}
+
+    header = next(csv.reader(io.StringIO(bulk_io.csv_header())))
+    row = dict(zip(header, next(csv.reader(io.StringIO(bulk_io.csv_row(outcome))))))
+
+    assert row["*Category"] == "183454"
+    assert row["*StartPrice"] == "49.99"
+    assert row["*Location"] == "Austin, TX"
+    assert (row["*Quantity"], row["*Format"], row["*Duration"]) == ("1", "FixedPrice", "GTC")
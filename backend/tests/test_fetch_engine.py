@@ -0,0 +1,55 @@
+import asyncio
+
+import httpx
+
+from fetch_engine import FetchEngine, SingleFlight, TokenBucket
+
+
+def make_engine(limiter: TokenBucket) -> FetchEngine:
+    engine = FetchEngine(max_concurrency=10, limiter=limiter)
+    engine._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={})))
+    return engine
+
+
+async def keep_busy(limiter: TokenBucket):
+    while True:
+        await limiter.acquire()
+
+
+def test_regular_caller_promotes_a_background_flight():
+    async def scenario():
+        limiter = TokenBucket(20, 5)
+        engine = make_engine(limiter)
+        flights = SingleFlight()
+        # Steady regular traffic: a background request alone would never find spare budget
+        busy = [asyncio.create_task(keep_busy(limiter)) for _ in range(3)]
+        try:
+            background = asyncio.create_task(flights.do(
+                "123", lambda promote: engine.get("http://psa/123", background=True, promote=promote), background=True
+            ))
+            await asyncio.sleep(0.2)
+            assert not background.done()
+            response = await asyncio.wait_for(flights.do("123", lambda: engine.get("http://psa/123")), 1.0)
+            assert response.status_code == 200
+            assert (await background) is response
+        finally:
+            for task in busy:
+                task.cancel()
+            await asyncio.gather(*busy, return_exceptions=True)
+            await engine.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_background_flight_uses_spare_budget():
+    async def scenario():
+        engine = make_engine(TokenBucket(20, 5))
+        flights = SingleFlight()
+        response = await asyncio.wait_for(flights.do(
+            "123", lambda promote: engine.get("http://psa/123", background=True, promote=promote), background=True
+        ), 1.0)
+        assert response.status_code == 200
+        assert not flights.calls and not flights.promotions
+        await engine.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,104 @@
+import asyncio
+import base64
+import io
+import os
+import tempfile
+
+import httpx
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+ImageDraw = pytest.importorskip("PIL.ImageDraw")
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp())
+
+import app  # noqa: E402
+import local_ocr  # noqa: E402
+from benchmarks.stub_servers import StubConfig, create_app  # noqa: E402
+
+
+def slab_photo(cert_numbers) -> bytes:
+    """A photo of slabs side by side, each label showing its cert number"""
+    image = Image.new("RGB", (220 * len(cert_numbers), 300), "white")
+    draw = ImageDraw.Draw(image)
+    for index, cert_number in enumerate(cert_numbers):
+        left = index * 220 + 10
+        draw.rectangle((left, 10, left + 200, 290), outline="black", width=3)
+        draw.text((left + 20, 40), f"PSA {cert_number}", fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def readers(monkeypatch):
+    """Stand in for pyzbar and tesseract, which need native libraries, with fixed reads of each photo"""
+    reads = {"barcodes": [], "digits": ([], 0.0)}
+    monkeypatch.setattr(local_ocr, "available", lambda: True)
+    monkeypatch.setattr(local_ocr, "decode_barcodes", lambda image: list(reads["barcodes"]))
+    monkeypatch.setattr(local_ocr, "read_digits", lambda image: reads["digits"])
+    return reads
+
+
+@pytest.fixture
+def openai_calls():
+    """Point the OpenAI engine at the stub server, recording each vision request"""
+    calls = []
+
+    async def record(request):
+        calls.append(request)
+
+    app.openai_engine._client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=create_app(StubConfig(openai_latency=0.0, jitter=0.0))),
+        base_url=app.OPENAI_API_BASE_URL,
+        event_hooks={"request": [record]},
+    )
+    yield calls
+    app.openai_engine._client = None
+
+
+def extract(photo: bytes, single_slab: bool = False):
+    image = base64.b64encode(photo).decode()
+    return asyncio.run(app.extract_cert_numbers(image, None, single_slab=single_slab))
+
+
+def test_one_barcode_on_a_single_slab_photo_skips_ocr_and_openai(readers, openai_calls):
+    readers["barcodes"] = ["10000001"]
+    readers["digits"] = (["10000001", "55555555"], 0.95)
+
+    assert extract(slab_photo(["10000001"]), single_slab=True) == ["10000001"]
+    assert openai_calls == []
+
+
+def test_barcodes_are_trusted_when_ocr_counts_the_same_slabs(readers, openai_calls):
+    readers["barcodes"] = ["20000001", "20000002"]
+    readers["digits"] = (["20000001", "20000008"], 0.4)
+
+    assert extract(slab_photo(["20000001", "20000002"])) == ["20000001", "20000002"]
+    assert openai_calls == []
+
+
+def test_partial_barcode_read_of_a_multi_slab_photo_falls_back_to_openai(readers, openai_calls):
+    readers["barcodes"] = ["30000001"]
+    readers["digits"] = (["30000001", "30000002", "30000003"], 0.5)
+
+    cert_numbers = extract(slab_photo(["30000001", "30000002", "30000003"]))
+
+    assert len(openai_calls) == 1
+    assert len(cert_numbers) == StubConfig.certs_per_image
+
+
+def test_barcode_without_ocr_confirmation_is_not_the_whole_answer(readers, openai_calls):
+    readers["barcodes"] = ["40000001"]
+
+    extract(slab_photo(["40000001", "40000002"]))
+
+    assert len(openai_calls) == 1
+
+
+def test_confident_ocr_fills_in_slabs_whose_barcodes_did_not_decode(readers):
+    readers["barcodes"] = ["50000001"]
+    readers["digits"] = (["50000001", "50000002"], 0.97)
+
+    photo = slab_photo(["50000001", "50000002"])
+    assert local_ocr.extract_cert_numbers_locally(photo) == (["50000001", "50000002"], 0.97)
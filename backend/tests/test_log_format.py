@@ -0,0 +1,31 @@
+import json
+import logging
+import sys
+
+from log_format import JsonFormatter, KeyValueFormatter
+
+
+def make_record(**extra) -> logging.LogRecord:
+    record = logging.makeLogRecord({"name": "app", "levelname": "WARNING", "msg": "PSA API unavailable for cert #%s", "args": ("12345678",)})
+    for name, value in extra.items():
+        setattr(record, name, value)
+    return record
+
+
+def test_json_lines_carry_extra_fields():
+    entry = json.loads(JsonFormatter().format(make_record(cert_number="12345678", stage="psa_fetch")))
+    assert entry["message"] == "PSA API unavailable for cert #12345678"
+    assert entry["cert_number"] == "12345678"
+    assert entry["stage"] == "psa_fetch"
+    assert entry["level"] == "WARNING"
+
+
+def test_key_value_fields_stay_on_the_message_line():
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        record = make_record(cert_number="12345678", stage="persist")
+        record.exc_info = sys.exc_info()
+    first, *rest = KeyValueFormatter("%(message)s").format(record).split("\n")
+    assert first == 'PSA API unavailable for cert #12345678 cert_number="12345678" stage="persist"'
+    assert any("RuntimeError: boom" in line for line in rest)
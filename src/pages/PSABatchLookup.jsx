@@ -52,15 +52,14 @@ export default function PSABatchLookup() {
     setResults(null);
 
     try {
-      const response = await fetch(`${API_URL}/api/psa/lookup/batch`, {
+      const response = await fetch(`${API_URL}/api/psa/lookup/batch/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Accept': 'application/json',
+          'Accept': 'application/x-ndjson',
         },
         body: JSON.stringify({
-          cert_input: certInput,
-          delay: 1.0
+          cert_input: certInput
         }),
       });
 
@@ -69,8 +68,48 @@ export default function PSABatchLookup() {
         throw new Error(errorData || 'Failed to fetch data');
       }
 
-      const data = await response.json();
-      setResults(data);
+      // Results arrive one JSON line per cert, followed by a summary line
+      setResults({ total_processed: 0, successful: 0, failed: 0, results: [], errors: [] });
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      const handleLine = (line) => {
+        if (!line.trim()) return;
+        const record = JSON.parse(line);
+        if (record.type === 'summary') {
+          setResults(prev => ({
+            ...prev,
+            total_processed: record.total_processed,
+            successful: record.successful,
+            failed: record.failed
+          }));
+        } else if (record.success) {
+          setResults(prev => ({
+            ...prev,
+            total_processed: prev.total_processed + 1,
+            successful: prev.successful + 1,
+            results: [...prev.results, record]
+          }));
+        } else {
+          setResults(prev => ({
+            ...prev,
+            total_processed: prev.total_processed + 1,
+            failed: prev.failed + 1,
+            errors: [...prev.errors, record]
+          }));
+        }
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.forEach(handleLine);
+      }
+      handleLine(buffer);
     } catch (err) {
       setError(err.message);
       console.error('Error:', err);
@@ -20,10 +20,8 @@ const PSALookup = () => {
       const controller = new AbortController()
       const timeoutId = setTimeout(() => controller.abort(), 30000) // 30 second timeout
 
-      const response = await fetch('http://localhost:8000/api/psa/lookup', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ cert_number: certNumber }),
+      // GET so the browser (and any CDN) can cache the lookup and revalidate it with its ETag
+      const response = await fetch(`http://localhost:8000/api/psa/lookup/${encodeURIComponent(certNumber.trim())}`, {
         signal: controller.signal
       })
       